@@ -16,14 +16,56 @@
     >>>
     >>> normalizer = AguiEventNormalizer()
     >>> for event in raw_events:
-    ...     for normalized_event in normalizer.normalize(event):
+    ...     normalized_event = normalizer.normalize(event)
+    ...     if normalized_event is not None:
     ...         yield normalized_event
 """
 
-from typing import Any, Dict, Iterator, List, Optional, Set, Union
+import sys
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from .model import AgentEvent, EventType
 
+# 需要追踪状态的事件类型
+# 注意：AgentEvent 启用了 use_enum_values，event 字段保存的是枚举值字符串，
+# 因此不能用 `is EventType.X` 做身份比较；这里直接与枚举值字符串比较，
+# 省去每次比较时的 EventType 属性查找
+_TOOL_CALL_CHUNK = EventType.TOOL_CALL_CHUNK.value
+_TOOL_CALL = EventType.TOOL_CALL.value
+_TOOL_RESULT = EventType.TOOL_RESULT.value
+
+# 常用的数据字段名，显式驻留以复用缓存的哈希值
+_K_ID = sys.intern("id")
+_K_NAME = sys.intern("name")
+_K_DATA = sys.intern("data")
+_K_EVENT = sys.intern("event")
+_K_DELTA = sys.intern("delta")
+
+# 事件类型查找表：同时支持枚举值和枚举名称（如 "TEXT"）
+_EVENT_TYPE_LOOKUP: Dict[str, EventType] = {
+    **{member.value: member for member in EventType},
+    **{member.name: member for member in EventType},
+}
+
+
+def _make_text_event(delta: str) -> AgentEvent:
+    """为字符串输入构造 TEXT 事件
+
+    仍走 pydantic 校验构造：AgentEvent.model_construct 在此模型上反而更慢，
+    且会跳过 use_enum_values 转换，导致 event 字段保留枚举成员。
+    """
+    return AgentEvent(event=EventType.TEXT, data={_K_DELTA: delta})
+
 
 class AguiEventNormalizer:
     """AG-UI 事件规范化器
@@ -38,23 +80,50 @@ class AguiEventNormalizer:
     Example:
         >>> normalizer = AguiEventNormalizer()
         >>> for event in agent_events:
-        ...     for normalized in normalizer.normalize(event):
+        ...     normalized = normalizer.normalize(event)
+        ...     if normalized is not None:
         ...         yield normalized
     """
 
-    def __init__(self):
-        # 已看到的工具调用 ID 集合
-        self._seen_tool_calls: Set[str] = set()
+    __slots__ = ("_active_tool_calls", "_inactive_tool_calls", "_trust_input")
+
+    def __init__(self, trust_input: bool = False):
+        """初始化规范化器
+
+        Args:
+            trust_input: 为 True 时假定输入均为 AgentEvent，跳过类型转换。
+                仅在事件来源可控（如内部调用链）时开启
+        """
+        # 输入是否已保证为 AgentEvent
+        self._trust_input = trust_input
         # 活跃的工具调用信息（tool_call_id -> tool_call_name）
         self._active_tool_calls: Dict[str, str] = {}
+        # 已见过但当前不活跃的工具调用 ID（尚无名称或已完成）
+        # 已见过的 ID = 活跃 ID ∪ 不活跃 ID，按需合成，避免每个事件维护两份集合
+        self._inactive_tool_calls: Set[str] = set()
 
     def normalize(
         self,
         event: Union[AgentEvent, str, Dict[str, Any]],
-    ) -> Iterator[AgentEvent]:
+    ) -> Optional[AgentEvent]:
         """规范化单个事件
 
         将事件标准化为 AgentEvent，并追踪工具调用状态。
+        每个输入最多产生一个事件，因此直接返回结果而不是生成器。
+
+        Args:
+            event: 原始事件（AgentEvent、str 或 dict）
+
+        Returns:
+            规范化后的事件；无法解析的输入返回 None
+        """
+        return self._process(event)
+
+    def normalize_iter(
+        self,
+        event: Union[AgentEvent, str, Dict[str, Any]],
+    ) -> Iterator[AgentEvent]:
+        """以迭代器形式规范化单个事件（兼容旧接口）
 
         Args:
             event: 原始事件（AgentEvent、str 或 dict）
@@ -62,26 +131,84 @@ class AguiEventNormalizer:
         Yields:
             规范化后的事件
         """
-        # 将事件标准化为 AgentEvent
-        normalized_event = self._to_agent_event(event)
-        if normalized_event is None:
-            return
+        normalized_event = self._process(event)
+        if normalized_event is not None:
+            yield normalized_event
+
+    def normalize_batch(
+        self,
+        events: Iterable[Union[AgentEvent, str, Dict[str, Any]]],
+    ) -> List[AgentEvent]:
+        """批量规范化事件
+
+        与逐个调用 normalize 的结果一致，但在单个栈帧内完成循环，
+        并将方法和事件类型绑定为局部变量，减少逐事件的调用开销。
+
+        Args:
+            events: 原始事件序列
+
+        Returns:
+            规范化后的事件列表（无法解析的输入会被跳过）
+        """
+        to_agent_event = self._to_agent_event
+        trust_input = self._trust_input
+        record_tool_call = self._record_tool_call
+        handle_tool_result = self._handle_tool_result
+        tool_call_chunk = _TOOL_CALL_CHUNK
+        tool_call = _TOOL_CALL
+        tool_result = _TOOL_RESULT
+
+        normalized_events: List[AgentEvent] = []
+        append = normalized_events.append
+        for event in events:
+            if trust_input:
+                assert isinstance(event, AgentEvent)
+                normalized_event = event
+            else:
+                normalized_event = to_agent_event(event)
+                if normalized_event is None:
+                    continue
+
+            event_type = normalized_event.event
+            if event_type == tool_call_chunk:
+                record_tool_call(normalized_event, require_name=True)
+            elif event_type == tool_call:
+                record_tool_call(normalized_event)
+            elif event_type == tool_result:
+                handle_tool_result(normalized_event)
+
+            append(normalized_event)
+
+        return normalized_events
+
+    def _process(
+        self,
+        event: Union[AgentEvent, str, Dict[str, Any]],
+    ) -> Optional[AgentEvent]:
+        """规范化事件并更新工具调用状态"""
+        # 将事件标准化为 AgentEvent（可信输入直接使用）
+        if self._trust_input:
+            assert isinstance(event, AgentEvent)
+            normalized_event = event
+        else:
+            normalized_event = self._to_agent_event(event)
+            if normalized_event is None:
+                return None
 
         # 根据事件类型进行处理
         event_type = normalized_event.event
 
-        if event_type == EventType.TOOL_CALL_CHUNK:
-            yield from self._handle_tool_call_chunk(normalized_event)
+        if event_type == _TOOL_CALL_CHUNK:
+            self._record_tool_call(normalized_event, require_name=True)
 
-        elif event_type == EventType.TOOL_CALL:
-            yield from self._handle_tool_call(normalized_event)
+        elif event_type == _TOOL_CALL:
+            self._record_tool_call(normalized_event)
 
-        elif event_type == EventType.TOOL_RESULT:
-            yield from self._handle_tool_result(normalized_event)
+        elif event_type == _TOOL_RESULT:
+            self._handle_tool_result(normalized_event)
 
-        else:
-            # 其他事件类型直接传递
-            yield normalized_event
+        # 其他事件类型直接传递
+        return normalized_event
 
     def _to_agent_event(
         self, event: Union[AgentEvent, str, Dict[str, Any]]
@@ -92,89 +219,74 @@ class AguiEventNormalizer:
 
         if isinstance(event, str):
             # 字符串转为 TEXT
-            return AgentEvent(
-                event=EventType.TEXT,
-                data={"delta": event},
-            )
+            return _make_text_event(event)
 
         if isinstance(event, dict):
-            event_type = event.get("event")
-            if event_type is None:
-                return None
+            event_type = event.get(_K_EVENT)
 
-            # 尝试解析 event_type
-            if isinstance(event_type, str):
-                try:
-                    event_type = EventType(event_type)
-                except ValueError:
-                    try:
-                        event_type = EventType[event_type]
-                    except KeyError:
-                        return None
+            # 解析 event_type：EventType 成员无需查表，字符串只查一次表，
+            # 缺失或其他类型直接返回 None，不依赖异常控制流
+            if not isinstance(event_type, EventType):
+                if not isinstance(event_type, str):
+                    return None
+                event_type = _EVENT_TYPE_LOOKUP.get(event_type)
+                if event_type is None:
+                    return None
 
             return AgentEvent(
                 event=event_type,
-                data=event.get("data", {}),
+                data=event.get(_K_DATA, {}),
             )
 
         return None
 
-    def _handle_tool_call(self, event: AgentEvent) -> Iterator[AgentEvent]:
-        """处理 TOOL_CALL 事件
+    def _record_tool_call(
+        self, event: AgentEvent, require_name: bool = False
+    ) -> None:
+        """记录 TOOL_CALL / TOOL_CALL_CHUNK 事件中的工具调用
 
-        记录工具调用并直接传递
+        Args:
+            event: 工具调用事件
+            require_name: 为 True 时（TOOL_CALL_CHUNK）仅在提供名称时标记为活跃
         """
-        tool_call_id = event.data.get("id", "")
-        tool_call_name = event.data.get("name", "")
+        tool_call_id = event.data.get(_K_ID)
+        if not tool_call_id:
+            return
 
-        if tool_call_id:
-            self._seen_tool_calls.add(tool_call_id)
+        tool_call_name = event.data.get(_K_NAME, "")
+        if tool_call_name or not require_name:
             self._active_tool_calls[tool_call_id] = tool_call_name
+        elif tool_call_id not in self._active_tool_calls:
+            self._inactive_tool_calls.add(tool_call_id)
 
-        yield event
-
-    def _handle_tool_call_chunk(
-        self, event: AgentEvent
-    ) -> Iterator[AgentEvent]:
-        """处理 TOOL_CALL_CHUNK 事件
-
-        记录工具调用并直接传递
-        """
-        tool_call_id = event.data.get("id", "")
-        tool_call_name = event.data.get("name", "")
-
-        if tool_call_id:
-            self._seen_tool_calls.add(tool_call_id)
-            if tool_call_name:
-                self._active_tool_calls[tool_call_id] = tool_call_name
-
-        yield event
-
-    def _handle_tool_result(self, event: AgentEvent) -> Iterator[AgentEvent]:
+    def _handle_tool_result(self, event: AgentEvent) -> None:
         """处理 TOOL_RESULT 事件
 
         标记工具调用完成
         """
-        tool_call_id = event.data.get("id", "")
+        tool_call_id = event.data.get(_K_ID)
+        if not tool_call_id:
+            return
 
-        if tool_call_id:
-            # 标记工具调用已完成（从活跃列表移除）
-            self._active_tool_calls.pop(tool_call_id, None)
+        # 标记工具调用已完成（从活跃列表移到不活跃集合）
+        if self._active_tool_calls.pop(tool_call_id, None) is not None:
+            self._inactive_tool_calls.add(tool_call_id)
 
-        yield event
+    def get_active_tool_calls(self) -> Tuple[str, ...]:
+        """获取当前活跃（未结束）的工具调用 ID
 
-    def get_active_tool_calls(self) -> List[str]:
-        """获取当前活跃（未结束）的工具调用 ID 列表"""
-        return list(self._active_tool_calls.keys())
+        返回不可变快照，调用方在遍历时继续规范化事件也不受影响。
+        """
+        return tuple(self._active_tool_calls)
 
-    def get_seen_tool_calls(self) -> List[str]:
-        """获取所有已见过的工具调用 ID 列表"""
-        return list(self._seen_tool_calls)
+    def get_seen_tool_calls(self) -> Tuple[str, ...]:
+        """获取所有已见过的工具调用 ID（不可变快照）"""
+        return tuple(self._active_tool_calls.keys() | self._inactive_tool_calls)
 
     def reset(self):
         """重置状态
 
         在处理新的请求时，建议创建新的实例而不是复用。
         """
-        self._seen_tool_calls.clear()
         self._active_tool_calls.clear()
+        self._inactive_tool_calls.clear()
@@ -7,27 +7,49 @@ AG-UI 是一种开源、轻量级、基于事件的协议，用于标准化 AI A
 将 AgentResult 事件转换为 AG-UI SSE 格式。
 """
 
+import asyncio
 from dataclasses import dataclass, field
+import os
 from typing import (
     Any,
     AsyncIterator,
+    Callable,
     Dict,
     Iterator,
     List,
     Optional,
     TYPE_CHECKING,
 )
-import uuid
 
 if TYPE_CHECKING:
+    from ag_ui.core import BaseEvent
     from ag_ui.core import (
         Message as AguiMessage,
     )
-    from ag_ui.encoder import EventEncoder
 
+from ag_ui.core import CustomEvent as AguiCustomEvent
+from ag_ui.core import ToolMessage as AguiToolMessage
+from ag_ui.core import (
+    AssistantMessage,
+    RunErrorEvent,
+    RunFinishedEvent,
+    RunStartedEvent,
+    StateDeltaEvent,
+    StateSnapshotEvent,
+    SystemMessage,
+    TextMessageContentEvent,
+    TextMessageEndEvent,
+    TextMessageStartEvent,
+    ToolCallArgsEvent,
+    ToolCallEndEvent,
+    ToolCallResultEvent,
+    ToolCallStartEvent,
+    UserMessage,
+)
+from ag_ui.encoder import EventEncoder
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
-import pydash
+import orjson
 
 from ..utils.helper import merge, MergeOptions
 from .model import (
@@ -40,7 +62,7 @@ from .model import (
     Tool,
     ToolCall,
 )
-from .protocol import BaseProtocolHandler
+from .protocol import BaseProtocolHandler, batch_frames
 
 if TYPE_CHECKING:
     from .invoker import AgentInvoker
@@ -53,14 +75,292 @@ if TYPE_CHECKING:
 DEFAULT_PREFIX = "/ag-ui/agent"
 
 
-@dataclass
+def _uuid4_str() -> str:
+    """生成随机 UUID（版本 4）字符串
+
+    与 str(uuid.uuid4()) 格式相同，但直接格式化随机字节，
+    省去 UUID 对象的构造和整数转换。
+    """
+    h = os.urandom(16).hex()
+    variant = "89ab"[int(h[16], 16) & 3]
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{variant}{h[17:20]}-{h[20:]}"
+
+
+# 角色字符串到 MessageRole 的映射，避免逐条消息走枚举构造和异常分支
+_ROLE_MAP: Dict[str, MessageRole] = {role.value: role for role in MessageRole}
+
+# 快照消息角色到 ag-ui-protocol 消息类型的映射，未知角色的消息会被跳过
+_SNAPSHOT_MESSAGE_CLASSES: Dict[str, Any] = {
+    "user": UserMessage,
+    "assistant": AssistantMessage,
+    "system": SystemMessage,
+    "tool": AguiToolMessage,
+}
+
+
+def _event_encoder_excludes_none() -> bool:
+    """判断已安装的 EventEncoder 是否需要 exclude_none 省略空字段
+
+    ag-ui-protocol 0.1.x 的 EventEncoder 以 exclude_none=True 序列化；
+    1.x 改由模型自身省略未赋值的可选字段（必填字段及 dict 值中的 null 保留），
+    EventEncoder 不再传入 exclude_none。以一个示例事件比较两者输出即可区分。
+    """
+    probe = TextMessageEndEvent(message_id="__message_id__")
+    plain = f"data: {probe.model_dump_json(by_alias=True)}\n\n"
+    return EventEncoder().encode(probe) != plain
+
+
+class _OrjsonEventEncoder(EventEncoder):
+    """使用 orjson 完成 JSON 序列化的 EventEncoder
+
+    输出与已安装版本的 EventEncoder.encode 完全一致
+    （camelCase 字段、省略空的可选字段），
+    但 JSON 编码由 orjson 完成，直接输出 UTF-8，无需 ensure_ascii 处理。
+    """
+
+    # 与 EventEncoder 相同的空字段处理方式，导入时确定一次
+    _exclude_none = _event_encoder_excludes_none()
+
+    def encode(self, event: "BaseEvent") -> str:
+        return self.encode_bytes(event).decode()
+
+    def encode_bytes(self, event: "BaseEvent") -> bytes:
+        """将事件编码为 UTF-8 字节形式的 SSE 帧
+
+        StreamingResponse 会原样发送 bytes，省去逐帧的 str -> bytes 编码。
+        """
+        payload = orjson.dumps(
+            event.model_dump(
+                mode="json", by_alias=True, exclude_none=self._exclude_none
+            )
+        )
+        return b"data: " + payload + b"\n\n"
+
+
+# 编码器无状态，所有处理器共享同一个实例
+_ENCODER = _OrjsonEventEncoder()
+
+
+def _build_frame_template(event: "BaseEvent", *placeholders: str) -> bytes:
+    """以示例事件生成 SSE 帧模板
+
+    先用编码器编码示例事件，再将占位符字段替换为 % 格式化的位置参数
+    （参数为 orjson 编码后的 JSON 字符串字面量），
+    模板因此始终与当前 ag-ui-protocol 的输出格式一致。
+    """
+    template = _ENCODER.encode_bytes(event).replace(b"%", b"%%")
+    position = -1
+    for placeholder in placeholders:
+        quoted = orjson.dumps(placeholder)
+        index = template.find(quoted)
+        if index < 0:
+            raise ValueError(f"placeholder {placeholder!r} not found in frame")
+        # 位置参数按出现顺序填充，占位符顺序必须与帧中的字段顺序一致
+        if index < position:
+            raise ValueError(f"placeholder {placeholder!r} out of order")
+        position = index
+        template = template.replace(quoted, b"%s")
+    return template
+
+
+# 边界事件的载荷只有 ID 不同，预先生成模板，避免逐次构造和校验 pydantic 模型
+_RUN_STARTED_TEMPLATE = _build_frame_template(
+    RunStartedEvent(thread_id="__thread_id__", run_id="__run_id__"),
+    "__thread_id__",
+    "__run_id__",
+)
+_RUN_FINISHED_TEMPLATE = _build_frame_template(
+    RunFinishedEvent(thread_id="__thread_id__", run_id="__run_id__"),
+    "__thread_id__",
+    "__run_id__",
+)
+_TEXT_MESSAGE_START_TEMPLATE = _build_frame_template(
+    TextMessageStartEvent(message_id="__message_id__", role="assistant"),
+    "__message_id__",
+)
+_TEXT_MESSAGE_END_TEMPLATE = _build_frame_template(
+    TextMessageEndEvent(message_id="__message_id__"),
+    "__message_id__",
+)
+
+_TEXT_MESSAGE_CONTENT_TEMPLATE = _build_frame_template(
+    TextMessageContentEvent(message_id="__message_id__", delta="__delta__"),
+    "__message_id__",
+    "__delta__",
+)
+_TOOL_CALL_START_TEMPLATE = _build_frame_template(
+    ToolCallStartEvent(
+        tool_call_id="__tool_call_id__", tool_call_name="__tool_call_name__"
+    ),
+    "__tool_call_id__",
+    "__tool_call_name__",
+)
+_TOOL_CALL_ARGS_TEMPLATE = _build_frame_template(
+    ToolCallArgsEvent(tool_call_id="__tool_call_id__", delta="__delta__"),
+    "__tool_call_id__",
+    "__delta__",
+)
+_TOOL_CALL_END_TEMPLATE = _build_frame_template(
+    ToolCallEndEvent(tool_call_id="__tool_call_id__"),
+    "__tool_call_id__",
+)
+
+_STATE_SNAPSHOT_TEMPLATE = _build_frame_template(
+    StateSnapshotEvent(snapshot="__snapshot__"), "__snapshot__"
+)
+
+# 状态快照直接用 orjson 序列化时的选项：日期时间、dataclass 及内置类型的子类
+# 交给 default 处理（未提供 default 即抛出异常），从而回退到 pydantic 序列化，
+# 保证与 EventEncoder 输出一致
+_STATE_SNAPSHOT_DUMPS_OPTION = (
+    orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+)
+
+# 序列化 addition、HITL 参数等用户数据时的选项：与 json.dumps 一样
+# 将非 str 键转为字符串，而不是在流中途抛出异常
+_USER_DATA_DUMPS_OPTION = orjson.OPT_NON_STR_KEYS
+
+
+def _encode_run_started(thread_id: Any, run_id: Any) -> bytes:
+    """编码 RUN_STARTED 事件"""
+    if type(thread_id) is str and type(run_id) is str:
+        return _RUN_STARTED_TEMPLATE % (
+            orjson.dumps(thread_id),
+            orjson.dumps(run_id),
+        )
+    return _ENCODER.encode_bytes(
+        RunStartedEvent(thread_id=thread_id, run_id=run_id)
+    )
+
+
+def _encode_run_finished(thread_id: Any, run_id: Any) -> bytes:
+    """编码 RUN_FINISHED 事件"""
+    if type(thread_id) is str and type(run_id) is str:
+        return _RUN_FINISHED_TEMPLATE % (
+            orjson.dumps(thread_id),
+            orjson.dumps(run_id),
+        )
+    return _ENCODER.encode_bytes(
+        RunFinishedEvent(thread_id=thread_id, run_id=run_id)
+    )
+
+
+# 以下事件在 token 流中占绝大多数帧，字段均为字符串时直接填充模板；
+# 非字符串参数回退到 pydantic 模型，保持原有的校验行为
+
+
+def _encode_text_content(message_id: Any, delta: Any) -> bytes:
+    """编码 TEXT_MESSAGE_CONTENT 事件"""
+    if type(message_id) is str and type(delta) is str:
+        return _TEXT_MESSAGE_CONTENT_TEMPLATE % (
+            orjson.dumps(message_id),
+            orjson.dumps(delta),
+        )
+    return _ENCODER.encode_bytes(
+        TextMessageContentEvent(message_id=message_id, delta=delta)
+    )
+
+
+def _encode_tool_call_start(tool_call_id: Any, tool_call_name: Any) -> bytes:
+    """编码 TOOL_CALL_START 事件"""
+    if type(tool_call_id) is str and type(tool_call_name) is str:
+        return _TOOL_CALL_START_TEMPLATE % (
+            orjson.dumps(tool_call_id),
+            orjson.dumps(tool_call_name),
+        )
+    return _ENCODER.encode_bytes(
+        ToolCallStartEvent(
+            tool_call_id=tool_call_id, tool_call_name=tool_call_name
+        )
+    )
+
+
+def _encode_tool_call_args(tool_call_id: Any, delta: Any) -> bytes:
+    """编码 TOOL_CALL_ARGS 事件"""
+    if type(tool_call_id) is str and type(delta) is str:
+        return _TOOL_CALL_ARGS_TEMPLATE % (
+            orjson.dumps(tool_call_id),
+            orjson.dumps(delta),
+        )
+    return _ENCODER.encode_bytes(
+        ToolCallArgsEvent(tool_call_id=tool_call_id, delta=delta)
+    )
+
+
+def _encode_tool_call_end(tool_call_id: Any) -> bytes:
+    """编码 TOOL_CALL_END 事件"""
+    if type(tool_call_id) is str:
+        return _TOOL_CALL_END_TEMPLATE % (orjson.dumps(tool_call_id),)
+    return _ENCODER.encode_bytes(ToolCallEndEvent(tool_call_id=tool_call_id))
+
+
+def _encode_state_snapshot(snapshot: Any) -> bytes:
+    """编码 STATE_SNAPSHOT 事件
+
+    快照通常是较大的嵌套字典，直接由 orjson 序列化，
+    省去 pydantic 对整棵状态树的遍历；包含非 JSON 原生类型时回退到模型编码。
+    """
+    if type(snapshot) is dict:
+        try:
+            payload = orjson.dumps(
+                snapshot, option=_STATE_SNAPSHOT_DUMPS_OPTION
+            )
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            return _STATE_SNAPSHOT_TEMPLATE % (payload,)
+    return _ENCODER.encode_bytes(StateSnapshotEvent(snapshot=snapshot))
+
+
+# _format_stream 每处理多少个事件主动让出一次事件循环
+_YIELD_EVERY_EVENTS = 16
+
+# RUN_ERROR 帧的前缀，合并输出时遇到错误帧立即写出
+_RUN_ERROR_FRAME_PREFIX = b'data: {"type":"RUN_ERROR"'
+
+
+def _batch_frames(
+    frames: AsyncIterator[bytes],
+    max_bytes: int,
+    max_wait: float,
+) -> AsyncIterator[bytes]:
+    """合并 AG-UI SSE 帧，RUN_ERROR 帧立即写出
+
+    Args:
+        frames: SSE 帧流
+        max_bytes: 缓冲写出阈值
+        max_wait: 帧在缓冲中的最长等待时间（秒）
+
+    Returns:
+        合并后的 SSE 数据流
+    """
+    return batch_frames(
+        frames, max_bytes, max_wait, flush_prefix=_RUN_ERROR_FRAME_PREFIX
+    )
+
+
+@dataclass(slots=True)
 class TextState:
     started: bool = False
     ended: bool = False
-    message_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    message_id: str = field(default_factory=_uuid4_str)
+    # message_id 的 JSON 字符串字面量，文本消息的每一帧都会用到，只编码一次
+    message_id_json: bytes = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.message_id_json = orjson.dumps(self.message_id)
+
+    def restart(self) -> None:
+        """以新的 message_id 开始下一条文本消息，原地复用当前对象"""
+        self.message_id = _uuid4_str()
+        self.message_id_json = orjson.dumps(self.message_id)
+        self.started = True
+        self.ended = False
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolCallState:
     name: str = ""
     started: bool = False
@@ -69,57 +369,68 @@ class ToolCallState:
     is_hitl: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamStateMachine:
     text: TextState = field(default_factory=TextState)
     tool_call_states: Dict[str, ToolCallState] = field(default_factory=dict)
-    tool_result_chunks: Dict[str, List[str]] = field(default_factory=dict)
+    tool_result_chunks: Dict[str, bytearray] = field(default_factory=dict)
     run_errored: bool = False
 
-    def end_all_tools(
-        self, encoder: "EventEncoder", exclude: Optional[str] = None
-    ) -> Iterator[str]:
-        from ag_ui.core import ToolCallEndEvent
-
+    def end_all_tools(self, exclude: Optional[str] = None) -> List[bytes]:
+        """结束所有未结束的工具调用，返回 TOOL_CALL_END 帧列表"""
+        if not self.tool_call_states:
+            return []
+        frames: List[bytes] = []
         for tool_id, state in self.tool_call_states.items():
             if exclude and tool_id == exclude:
                 continue
             if state.started and not state.ended:
-                yield encoder.encode(ToolCallEndEvent(tool_call_id=tool_id))
+                frames.append(_encode_tool_call_end(tool_id))
                 state.ended = True
+        return frames
 
-    def ensure_text_started(self, encoder: "EventEncoder") -> Iterator[str]:
-        from ag_ui.core import TextMessageStartEvent
-
-        if not self.text.started or self.text.ended:
-            if self.text.ended:
-                self.text = TextState()
-            yield encoder.encode(
-                TextMessageStartEvent(
-                    message_id=self.text.message_id,
-                    role="assistant",
-                )
-            )
+    def ensure_text_started(self) -> Optional[bytes]:
+        """确保文本消息已开始，需要开始时返回 TEXT_MESSAGE_START 帧"""
+        if self.text.started and not self.text.ended:
+            return None
+        if self.text.ended:
+            self.text.restart()
+        else:
             self.text.started = True
-            self.text.ended = False
+        return _TEXT_MESSAGE_START_TEMPLATE % (self.text.message_id_json,)
 
-    def end_text_if_open(self, encoder: "EventEncoder") -> Iterator[str]:
-        from ag_ui.core import TextMessageEndEvent
-
-        if self.text.started and not self.text.ended:
-            yield encoder.encode(
-                TextMessageEndEvent(message_id=self.text.message_id)
-            )
-            self.text.ended = True
+    def end_text_if_open(self) -> Optional[bytes]:
+        """结束未关闭的文本消息，需要结束时返回 TEXT_MESSAGE_END 帧"""
+        if not self.text.started or self.text.ended:
+            return None
+        self.text.ended = True
+        return _TEXT_MESSAGE_END_TEMPLATE % (self.text.message_id_json,)
 
     def cache_tool_result_chunk(self, tool_id: str, delta: str) -> None:
         if not tool_id or delta is None:
             return
         if delta:
-            self.tool_result_chunks.setdefault(tool_id, []).append(delta)
+            buffer = self.tool_result_chunks.get(tool_id)
+            if buffer is None:
+                buffer = self.tool_result_chunks[tool_id] = bytearray()
+            buffer += delta.encode("utf-8")
+
+    def pop_tool_result_chunks(self, tool_id: str, suffix: str = "") -> str:
+        """取出并拼接缓存的工具结果分片
 
-    def pop_tool_result_chunks(self, tool_id: str) -> str:
-        return "".join(self.tool_result_chunks.pop(tool_id, []))
+        Args:
+            tool_id: 工具调用 ID
+            suffix: 追加在缓存分片之后的内容（如最终结果），与分片一起解码
+
+        Returns:
+            拼接后的结果；没有缓存分片时直接返回 suffix
+        """
+        buffer = self.tool_result_chunks.pop(tool_id, None)
+        if not buffer:
+            return suffix
+        if suffix:
+            buffer += suffix.encode("utf-8")
+        return buffer.decode("utf-8")
 
 
 class AGUIProtocolHandler(BaseProtocolHandler):
@@ -150,14 +461,40 @@ class AGUIProtocolHandler(BaseProtocolHandler):
     name = "ag-ui"
 
     def __init__(self, config: Optional[ServerConfig] = None):
-        from ag_ui.encoder import EventEncoder
-
         self._config = config.agui if config else None
-        self._encoder = EventEncoder()
+        self._encoder = _ENCODER
+        self._content_type = self._encoder.get_content_type()
+        # SSE 帧合并配置（batch_bytes <= 0 表示不合并）
+        self._batch_bytes = self._config.batch_bytes if self._config else 0
+        self._batch_max_wait = (
+            self._config.batch_max_wait_ms / 1000 if self._config else 0.0
+        )
+        # 事件分发表（以枚举值为键，AgentEvent.event 保存的是枚举值字符串）
+        self._handlers: Dict[
+            str,
+            Callable[
+                [AgentEvent, Dict[str, Any], StreamStateMachine],
+                Iterator[bytes],
+            ],
+        ] = {
+            EventType.RAW.value: self._handle_raw,
+            EventType.TEXT.value: self._handle_text,
+            EventType.TOOL_CALL_CHUNK.value: self._handle_tool_call_chunk,
+            EventType.TOOL_CALL.value: self._handle_tool_call,
+            EventType.TOOL_RESULT_CHUNK.value: self._handle_tool_result_chunk,
+            EventType.HITL.value: self._handle_hitl,
+            EventType.TOOL_RESULT.value: self._handle_tool_result,
+            EventType.ERROR.value: self._handle_error,
+            EventType.STATE.value: self._handle_state,
+            EventType.CUSTOM.value: self._handle_custom,
+        }
+        # 配置在处理器生命周期内不变，前缀只需解析一次
+        prefix = self._config.prefix if self._config is not None else None
+        self._prefix: str = prefix if prefix is not None else DEFAULT_PREFIX
 
     def get_prefix(self) -> str:
         """AG-UI 协议建议使用 /ag-ui/agent 前缀"""
-        return pydash.get(self._config, "prefix", DEFAULT_PREFIX)
+        return self._prefix
 
     def as_fastapi_router(self, agent_invoker: "AgentInvoker") -> APIRouter:
         """创建 AG-UI 协议的 FastAPI Router"""
@@ -176,7 +513,7 @@ class AGUIProtocolHandler(BaseProtocolHandler):
             }
 
             try:
-                request_data = await request.json()
+                request_data = orjson.loads(await request.body())
                 agent_request, context = await self.parse_request(
                     request, request_data
                 )
@@ -186,23 +523,29 @@ class AGUIProtocolHandler(BaseProtocolHandler):
                     agent_invoker.invoke_stream(agent_request),
                     context,
                 )
+                if self._batch_bytes > 0:
+                    event_stream = _batch_frames(
+                        event_stream,
+                        self._batch_bytes,
+                        self._batch_max_wait,
+                    )
 
                 return StreamingResponse(
                     event_stream,
-                    media_type=self._encoder.get_content_type(),
+                    media_type=self._content_type,
                     headers=sse_headers,
                 )
 
             except ValueError as e:
                 return StreamingResponse(
                     self._error_stream(str(e)),
-                    media_type=self._encoder.get_content_type(),
+                    media_type=self._content_type,
                     headers=sse_headers,
                 )
             except Exception as e:
                 return StreamingResponse(
                     self._error_stream(f"Internal error: {str(e)}"),
-                    media_type=self._encoder.get_content_type(),
+                    media_type=self._content_type,
                     headers=sse_headers,
                 )
 
@@ -229,8 +572,8 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         """
         # 创建上下文
         context = {
-            "thread_id": request_data.get("threadId") or str(uuid.uuid4()),
-            "run_id": request_data.get("runId") or str(uuid.uuid4()),
+            "thread_id": request_data.get("threadId") or _uuid4_str(),
+            "run_id": request_data.get("runId") or _uuid4_str(),
         }
 
         # 解析消息列表
@@ -261,42 +604,54 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         Returns:
             标准化的消息列表
         """
-        messages = []
+        return [
+            self._parse_message(msg_data)
+            for msg_data in raw_messages
+            if isinstance(msg_data, dict)
+        ]
 
-        for msg_data in raw_messages:
-            if not isinstance(msg_data, dict):
-                continue
+    def _parse_message(self, msg_data: Dict[str, Any]) -> Message:
+        """解析单条消息
 
-            role_str = msg_data.get("role", "user")
-            try:
-                role = MessageRole(role_str)
-            except ValueError:
-                role = MessageRole.USER
-
-            # 解析 tool_calls
-            tool_calls = None
-            if msg_data.get("toolCalls"):
-                tool_calls = [
-                    ToolCall(
-                        id=tc.get("id", ""),
-                        type=tc.get("type", "function"),
-                        function=tc.get("function", {}),
-                    )
-                    for tc in msg_data["toolCalls"]
-                ]
-
-            messages.append(
-                Message(
-                    id=msg_data.get("id"),
-                    role=role,
-                    content=msg_data.get("content"),
-                    name=msg_data.get("name"),
-                    tool_calls=tool_calls,
-                    tool_call_id=msg_data.get("toolCallId"),
+        Args:
+            msg_data: 原始消息数据
+
+        Returns:
+            标准化的消息
+        """
+        get = msg_data.get
+
+        # 未知角色回退为 USER
+        role_str = get("role", "user")
+        role = (
+            _ROLE_MAP.get(role_str, MessageRole.USER)
+            if isinstance(role_str, str)
+            else MessageRole.USER
+        )
+
+        # 解析 tool_calls
+        raw_tool_calls = get("toolCalls")
+        tool_calls = (
+            [
+                ToolCall(
+                    id=tc.get("id", ""),
+                    type=tc.get("type", "function"),
+                    function=tc.get("function", {}),
                 )
-            )
+                for tc in raw_tool_calls
+            ]
+            if raw_tool_calls
+            else None
+        )
 
-        return messages
+        return Message(
+            id=get("id"),
+            role=role,
+            content=get("content"),
+            name=get("name"),
+            tool_calls=tool_calls,
+            tool_call_id=get("toolCallId"),
+        )
 
     def _parse_tools(
         self, raw_tools: Optional[List[Dict[str, Any]]]
@@ -312,17 +667,14 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         if not raw_tools:
             return None
 
-        tools = []
-        for tool_data in raw_tools:
-            if not isinstance(tool_data, dict):
-                continue
-
-            tools.append(
-                Tool(
-                    type=tool_data.get("type", "function"),
-                    function=tool_data.get("function", {}),
-                )
+        tools = [
+            Tool(
+                type=tool_data.get("type", "function"),
+                function=tool_data.get("function", {}),
             )
+            for tool_data in raw_tools
+            if isinstance(tool_data, dict)
+        ]
 
         return tools if tools else None
 
@@ -330,7 +682,7 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         self,
         event_stream: AsyncIterator[AgentEvent],
         context: Dict[str, Any],
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[bytes]:
         """将 AgentEvent 流转换为 AG-UI SSE 格式
 
         自动生成边界事件：
@@ -345,18 +697,19 @@ class AGUIProtocolHandler(BaseProtocolHandler):
             context: 上下文信息
 
         Yields:
-            SSE 格式的字符串
+            UTF-8 编码的 SSE 数据（同一事件产生的多个帧合并为一次写出）
         """
-        from ag_ui.core import RunFinishedEvent, RunStartedEvent
-
         state = StreamStateMachine()
 
+        # 循环内频繁访问的属性绑定为局部变量
+        process_event = self._process_event_with_boundaries
+        join = b"".join
+        error_type = EventType.ERROR.value
+        processed = 0
+
         # 发送 RUN_STARTED
-        yield self._encoder.encode(
-            RunStartedEvent(
-                thread_id=context.get("thread_id"),
-                run_id=context.get("run_id"),
-            )
+        yield _encode_run_started(
+            context.get("thread_id"), context.get("run_id")
         )
 
         async for event in event_stream:
@@ -365,334 +718,337 @@ class AGUIProtocolHandler(BaseProtocolHandler):
                 continue
 
             # 检查是否是错误事件
-            if event.event == EventType.ERROR:
+            if event.event == error_type:
                 state.run_errored = True
 
-            # 处理边界事件注入
-            for sse_data in self._process_event_with_boundaries(
-                event,
-                context,
-                state,
-            ):
-                if sse_data:
-                    yield sse_data
+            # 处理边界事件注入，同一事件产生的帧（如 START + CONTENT）合并写出
+            sse_data = join(process_event(event, context, state))
+            if sse_data:
+                yield sse_data
+
+            # 上游连续产出事件时不一定会让出事件循环，定期主动让出，
+            # 避免单个长流独占事件循环
+            processed += 1
+            if processed % _YIELD_EVERY_EVENTS == 0:
+                await asyncio.sleep(0)
 
         # RUN_ERROR 后不发送任何清理事件
         if state.run_errored:
             return
 
-        # 结束所有未结束的工具调用
-        for sse_data in state.end_all_tools(self._encoder):
-            yield sse_data
-
-        # 发送 TEXT_MESSAGE_END（如果有文本消息且未结束）
-        for sse_data in state.end_text_if_open(self._encoder):
-            yield sse_data
-
-        # 发送 RUN_FINISHED
-        yield self._encoder.encode(
-            RunFinishedEvent(
-                thread_id=context.get("thread_id"),
-                run_id=context.get("run_id"),
+        # 结束所有未结束的工具调用和文本消息，并发送 RUN_FINISHED
+        frames = state.end_all_tools()
+        text_end = state.end_text_if_open()
+        if text_end:
+            frames.append(text_end)
+        frames.append(
+            _encode_run_finished(
+                context.get("thread_id"), context.get("run_id")
             )
         )
+        yield b"".join(frames)
 
     def _process_event_with_boundaries(
         self,
         event: AgentEvent,
         context: Dict[str, Any],
         state: StreamStateMachine,
-    ) -> Iterator[str]:
-        """处理事件并注入边界事件"""
-        import json
-
-        from ag_ui.core import CustomEvent as AguiCustomEvent
-        from ag_ui.core import (
-            RunErrorEvent,
-            StateDeltaEvent,
-            StateSnapshotEvent,
-            TextMessageContentEvent,
-            ToolCallArgsEvent,
-            ToolCallEndEvent,
-            ToolCallResultEvent,
-            ToolCallStartEvent,
-        )
+    ) -> Iterator[bytes]:
+        """处理事件并注入边界事件
 
-        # RAW 事件直接透传
-        if event.event == EventType.RAW:
-            raw_data = event.data.get("raw", "")
-            if raw_data:
-                if not raw_data.endswith("\n\n"):
-                    raw_data = raw_data.rstrip("\n") + "\n\n"
-                yield raw_data
-            return
+        按事件类型查表分发到对应的处理方法，未知事件类型作为 CUSTOM 事件发送。
+        """
+        handler = self._handlers.get(event.event, self._handle_unknown)
+        return handler(event, context, state)
 
-        # TEXT 事件：在首个 TEXT 前注入 TEXT_MESSAGE_START
-        # AG-UI 协议要求：发送 TEXT_MESSAGE_START 前必须先结束所有未结束的 TOOL_CALL
-        if event.event == EventType.TEXT:
-            for sse_data in state.end_all_tools(self._encoder):
-                yield sse_data
+    def _handle_raw(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """RAW 事件直接透传"""
+        raw_data = event.data.get("raw", "")
+        if raw_data:
+            # 补齐 SSE 帧结尾的空行；末尾最多只有一个换行，无需 rstrip 复制
+            if not raw_data.endswith("\n\n"):
+                if raw_data.endswith("\n"):
+                    raw_data += "\n"
+                else:
+                    raw_data += "\n\n"
+            yield raw_data.encode("utf-8")
+
+    def _handle_text(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """TEXT 事件：在首个 TEXT 前注入 TEXT_MESSAGE_START
 
-            for sse_data in state.ensure_text_started(self._encoder):
-                yield sse_data
+        AG-UI 协议要求：发送 TEXT_MESSAGE_START 前必须先结束所有未结束的 TOOL_CALL
+        """
+        # 纯文本流中没有工具调用，跳过 end_all_tools 调用
+        if state.tool_call_states:
+            yield from state.end_all_tools()
 
+        text_start = state.ensure_text_started()
+        if text_start:
+            yield text_start
+
+        delta = event.data.get("delta", "")
+        if event.addition:
             agui_event = TextMessageContentEvent(
                 message_id=state.text.message_id,
-                delta=event.data.get("delta", ""),
+                delta=delta,
             )
-            if event.addition:
-                event_dict = agui_event.model_dump(
-                    by_alias=True, exclude_none=True
-                )
-                event_dict = self._apply_addition(
-                    event_dict,
-                    event.addition,
-                    event.addition_merge_options,
-                )
-                json_str = json.dumps(event_dict, ensure_ascii=False)
-                yield f"data: {json_str}\n\n"
-            else:
-                yield self._encoder.encode(agui_event)
-            return
+            event_dict = agui_event.model_dump(by_alias=True, exclude_none=True)
+            event_dict = self._apply_addition(
+                event_dict,
+                event.addition,
+                event.addition_merge_options,
+            )
+            yield (
+                b"data: "
+                + orjson.dumps(event_dict, option=_USER_DATA_DUMPS_OPTION)
+                + b"\n\n"
+            )
+        elif type(delta) is str:
+            yield _TEXT_MESSAGE_CONTENT_TEMPLATE % (
+                state.text.message_id_json,
+                orjson.dumps(delta),
+            )
+        else:
+            yield _encode_text_content(state.text.message_id, delta)
 
-        # TOOL_CALL_CHUNK 事件：在首个 CHUNK 前注入 TOOL_CALL_START
-        if event.event == EventType.TOOL_CALL_CHUNK:
-            tool_id = event.data.get("id", "")
-            tool_name = event.data.get("name", "")
+    def _handle_tool_call_chunk(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """TOOL_CALL_CHUNK 事件：在首个 CHUNK 前注入 TOOL_CALL_START"""
+        return self._emit_tool_call(event, state, is_chunk=True)
 
-            for sse_data in state.end_text_if_open(self._encoder):
-                yield sse_data
+    def _handle_tool_call(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """TOOL_CALL 事件：完整的工具调用事件"""
+        return self._emit_tool_call(event, state, is_chunk=False)
 
-            need_start = False
-            current_state = state.tool_call_states.get(tool_id)
-            if tool_id:
-                if current_state is None or current_state.ended:
-                    need_start = True
-
-            if need_start:
-                yield self._encoder.encode(
-                    ToolCallStartEvent(
-                        tool_call_id=tool_id,
-                        tool_call_name=tool_name,
-                    )
-                )
-                state.tool_call_states[tool_id] = ToolCallState(
-                    name=tool_name,
-                    started=True,
-                    ended=False,
-                )
+    def _emit_tool_call(
+        self,
+        event: AgentEvent,
+        state: StreamStateMachine,
+        *,
+        is_chunk: bool,
+    ) -> Iterator[bytes]:
+        """TOOL_CALL / TOOL_CALL_CHUNK 的公共处理逻辑
 
-            yield self._encoder.encode(
-                ToolCallArgsEvent(
-                    tool_call_id=tool_id,
-                    delta=event.data.get("args_delta", ""),
-                )
-            )
-            return
+        结束未关闭的文本消息，在工具调用未开始（或已结束）时注入
+        TOOL_CALL_START，然后发送参数。
 
-        # TOOL_CALL 事件：完整的工具调用事件
-        if event.event == EventType.TOOL_CALL:
-            tool_id = event.data.get("id", "")
-            tool_name = event.data.get("name", "")
-            tool_args = event.data.get("args", "")
+        Args:
+            event: 工具调用事件
+            state: 流状态机
+            is_chunk: 为 True 时参数取自 args_delta 且总是发送 TOOL_CALL_ARGS；
+                否则参数取自 args，仅在非空时发送
+        """
+        data = event.data
+        tool_id = data.get("id", "")
+        tool_name = data.get("name", "")
+        tool_args = data.get("args_delta" if is_chunk else "args", "")
 
-            for sse_data in state.end_text_if_open(self._encoder):
-                yield sse_data
+        text_end = state.end_text_if_open()
+        if text_end:
+            yield text_end
 
-            need_start = False
+        if tool_id:
             current_state = state.tool_call_states.get(tool_id)
-            if tool_id:
-                if current_state is None or current_state.ended:
-                    need_start = True
-
-            if need_start:
-                yield self._encoder.encode(
-                    ToolCallStartEvent(
-                        tool_call_id=tool_id,
-                        tool_call_name=tool_name,
-                    )
-                )
+            if current_state is None or current_state.ended:
+                yield _encode_tool_call_start(tool_id, tool_name)
                 state.tool_call_states[tool_id] = ToolCallState(
                     name=tool_name,
                     started=True,
                     ended=False,
                 )
 
-            # 发送工具参数（如果存在）
-            if tool_args:
-                yield self._encoder.encode(
-                    ToolCallArgsEvent(
-                        tool_call_id=tool_id,
-                        delta=tool_args,
-                    )
-                )
-            return
+        if is_chunk or tool_args:
+            yield _encode_tool_call_args(tool_id, tool_args)
 
-        # TOOL_RESULT_CHUNK 事件：工具执行过程中的流式输出
-        if event.event == EventType.TOOL_RESULT_CHUNK:
-            tool_id = event.data.get("id", "")
-            delta = event.data.get("delta", "")
-            state.cache_tool_result_chunk(tool_id, delta)
+    def _handle_tool_result_chunk(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """TOOL_RESULT_CHUNK 事件：缓存工具执行过程中的流式输出"""
+        tool_id = event.data.get("id", "")
+        delta = event.data.get("delta", "")
+        state.cache_tool_result_chunk(tool_id, delta)
+        return iter(())
+
+    def _handle_hitl(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """HITL 事件：请求人类介入"""
+        hitl_id = event.data.get("id", "")
+        tool_call_id = event.data.get("tool_call_id", "")
+        hitl_type = event.data.get("type", "confirmation")
+        prompt = event.data.get("prompt", "")
+        options = event.data.get("options")
+        default = event.data.get("default")
+        timeout = event.data.get("timeout")
+        schema = event.data.get("schema")
+
+        text_end = state.end_text_if_open()
+        if text_end:
+            yield text_end
+
+        if tool_call_id and tool_call_id in state.tool_call_states:
+            tool_state = state.tool_call_states[tool_call_id]
+            if tool_state.started and not tool_state.ended:
+                yield _encode_tool_call_end(tool_call_id)
+                tool_state.ended = True
+            tool_state.is_hitl = True
+            tool_state.has_result = False
             return
 
-        # HITL 事件：请求人类介入
-        if event.event == EventType.HITL:
-            hitl_id = event.data.get("id", "")
-            tool_call_id = event.data.get("tool_call_id", "")
-            hitl_type = event.data.get("type", "confirmation")
-            prompt = event.data.get("prompt", "")
-            options = event.data.get("options")
-            default = event.data.get("default")
-            timeout = event.data.get("timeout")
-            schema = event.data.get("schema")
-
-            for sse_data in state.end_text_if_open(self._encoder):
-                yield sse_data
-
-            if tool_call_id and tool_call_id in state.tool_call_states:
-                tool_state = state.tool_call_states[tool_call_id]
-                if tool_state.started and not tool_state.ended:
-                    yield self._encoder.encode(
-                        ToolCallEndEvent(tool_call_id=tool_call_id)
-                    )
-                    tool_state.ended = True
-                tool_state.is_hitl = True
-                tool_state.has_result = False
-                return
-
-            import json as json_module
+        args_dict: Dict[str, Any] = {
+            "type": hitl_type,
+            "prompt": prompt,
+        }
+        if options:
+            args_dict["options"] = options
+        if default is not None:
+            args_dict["default"] = default
+        if timeout is not None:
+            args_dict["timeout"] = timeout
+        if schema:
+            args_dict["schema"] = schema
+
+        args_json = orjson.dumps(
+            args_dict, option=_USER_DATA_DUMPS_OPTION
+        ).decode()
+        actual_id = tool_call_id or hitl_id
+
+        yield _encode_tool_call_start(actual_id, f"hitl_{hitl_type}")
+        yield _encode_tool_call_args(actual_id, args_json)
+        yield _encode_tool_call_end(actual_id)
+
+        state.tool_call_states[actual_id] = ToolCallState(
+            name=f"hitl_{hitl_type}",
+            started=True,
+            ended=True,
+            has_result=False,
+            is_hitl=True,
+        )
 
-            args_dict: Dict[str, Any] = {
-                "type": hitl_type,
-                "prompt": prompt,
-            }
-            if options:
-                args_dict["options"] = options
-            if default is not None:
-                args_dict["default"] = default
-            if timeout is not None:
-                args_dict["timeout"] = timeout
-            if schema:
-                args_dict["schema"] = schema
-
-            args_json = json_module.dumps(args_dict, ensure_ascii=False)
-            actual_id = tool_call_id or hitl_id
-
-            yield self._encoder.encode(
-                ToolCallStartEvent(
-                    tool_call_id=actual_id,
-                    tool_call_name=f"hitl_{hitl_type}",
-                )
-            )
-            yield self._encoder.encode(
-                ToolCallArgsEvent(
-                    tool_call_id=actual_id,
-                    delta=args_json,
-                )
-            )
-            yield self._encoder.encode(ToolCallEndEvent(tool_call_id=actual_id))
-
-            state.tool_call_states[actual_id] = ToolCallState(
-                name=f"hitl_{hitl_type}",
-                started=True,
-                ended=True,
-                has_result=False,
-                is_hitl=True,
+    def _handle_tool_result(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """TOOL_RESULT 事件：确保当前工具调用已结束"""
+        tool_id = event.data.get("id", "")
+        tool_name = event.data.get("name", "")
+
+        text_end = state.end_text_if_open()
+        if text_end:
+            yield text_end
+
+        tool_state = state.tool_call_states.get(tool_id) if tool_id else None
+        if tool_id and tool_state is None:
+            yield _encode_tool_call_start(tool_id, tool_name or "")
+            tool_state = ToolCallState(
+                name=tool_name, started=True, ended=False
             )
-            return
-
-        # TOOL_RESULT 事件：确保当前工具调用已结束
-        if event.event == EventType.TOOL_RESULT:
-            tool_id = event.data.get("id", "")
-            tool_name = event.data.get("name", "")
-
-            for sse_data in state.end_text_if_open(self._encoder):
-                yield sse_data
-
-            tool_state = (
-                state.tool_call_states.get(tool_id) if tool_id else None
+            state.tool_call_states[tool_id] = tool_state
+
+        if tool_state and tool_state.started and not tool_state.ended:
+            yield _encode_tool_call_end(tool_id)
+            tool_state.ended = True
+
+        final_result = event.data.get("content") or event.data.get("result", "")
+        if tool_id:
+            # 缓存分片在前，最终结果在后，一次解码完成拼接
+            final_result = state.pop_tool_result_chunks(tool_id, final_result)
+
+        yield self._encoder.encode_bytes(
+            ToolCallResultEvent(
+                message_id=event.data.get(
+                    "message_id", f"tool-result-{tool_id}"
+                ),
+                tool_call_id=tool_id,
+                content=final_result,
+                role="tool",
             )
-            if tool_id and tool_state is None:
-                yield self._encoder.encode(
-                    ToolCallStartEvent(
-                        tool_call_id=tool_id,
-                        tool_call_name=tool_name or "",
-                    )
-                )
-                tool_state = ToolCallState(
-                    name=tool_name, started=True, ended=False
-                )
-                state.tool_call_states[tool_id] = tool_state
-
-            if tool_state and tool_state.started and not tool_state.ended:
-                yield self._encoder.encode(
-                    ToolCallEndEvent(tool_call_id=tool_id)
-                )
-                tool_state.ended = True
+        )
 
-            final_result = event.data.get("content") or event.data.get(
-                "result", ""
-            )
-            if tool_id:
-                cached_chunks = state.pop_tool_result_chunks(tool_id)
-                if cached_chunks:
-                    final_result = cached_chunks + final_result
-
-            yield self._encoder.encode(
-                ToolCallResultEvent(
-                    message_id=event.data.get(
-                        "message_id", f"tool-result-{tool_id}"
-                    ),
-                    tool_call_id=tool_id,
-                    content=final_result,
-                    role="tool",
-                )
+    def _handle_error(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """ERROR 事件"""
+        yield self._encoder.encode_bytes(
+            RunErrorEvent(
+                message=event.data.get("message", ""),
+                code=event.data.get("code"),
             )
-            return
+        )
 
-        # ERROR 事件
-        if event.event == EventType.ERROR:
-            yield self._encoder.encode(
-                RunErrorEvent(
-                    message=event.data.get("message", ""),
-                    code=event.data.get("code"),
-                )
+    def _handle_state(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """STATE 事件"""
+        if "snapshot" in event.data:
+            yield _encode_state_snapshot(event.data.get("snapshot", {}))
+        elif "delta" in event.data:
+            yield self._encoder.encode_bytes(
+                StateDeltaEvent(delta=event.data.get("delta", []))
             )
-            return
+        else:
+            yield _encode_state_snapshot(event.data)
 
-        # STATE 事件
-        if event.event == EventType.STATE:
-            if "snapshot" in event.data:
-                yield self._encoder.encode(
-                    StateSnapshotEvent(snapshot=event.data.get("snapshot", {}))
-                )
-            elif "delta" in event.data:
-                yield self._encoder.encode(
-                    StateDeltaEvent(delta=event.data.get("delta", []))
-                )
-            else:
-                yield self._encoder.encode(
-                    StateSnapshotEvent(snapshot=event.data)
-                )
-            return
-
-        # CUSTOM 事件
-        if event.event == EventType.CUSTOM:
-            yield self._encoder.encode(
-                AguiCustomEvent(
-                    name=event.data.get("name", "custom"),
-                    value=event.data.get("value"),
-                )
+    def _handle_custom(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """CUSTOM 事件"""
+        yield self._encoder.encode_bytes(
+            AguiCustomEvent(
+                name=event.data.get("name", "custom"),
+                value=event.data.get("value"),
             )
-            return
+        )
 
-        # 其他未知事件
+    def _handle_unknown(
+        self,
+        event: AgentEvent,
+        context: Dict[str, Any],
+        state: StreamStateMachine,
+    ) -> Iterator[bytes]:
+        """其他未知事件：作为 CUSTOM 事件发送"""
         event_name = (
             event.event.value
             if hasattr(event.event, "value")
             else str(event.event)
         )
-        yield self._encoder.encode(
+        yield self._encoder.encode_bytes(
             AguiCustomEvent(
                 name=event_name,
                 value=event.data,
@@ -710,36 +1066,24 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         Returns:
             ag-ui-protocol 消息列表
         """
-        from ag_ui.core import AssistantMessage, SystemMessage
-        from ag_ui.core import ToolMessage as AguiToolMessage
-        from ag_ui.core import UserMessage
-
         result = []
         for msg in messages:
             if not isinstance(msg, dict):
                 continue
 
             role = msg.get("role", "user")
+            message_cls = (
+                _SNAPSHOT_MESSAGE_CLASSES.get(role)
+                if isinstance(role, str)
+                else None
+            )
+            if message_cls is None:
+                continue
+
             content = msg.get("content", "")
-            msg_id = msg.get("id", str(uuid.uuid4()))
+            msg_id = msg["id"] if "id" in msg else _uuid4_str()
 
-            if role == "user":
-                result.append(
-                    UserMessage(id=msg_id, role="user", content=content)
-                )
-            elif role == "assistant":
-                result.append(
-                    AssistantMessage(
-                        id=msg_id,
-                        role="assistant",
-                        content=content,
-                    )
-                )
-            elif role == "system":
-                result.append(
-                    SystemMessage(id=msg_id, role="system", content=content)
-                )
-            elif role == "tool":
+            if message_cls is AguiToolMessage:
                 result.append(
                     AguiToolMessage(
                         id=msg_id,
@@ -748,6 +1092,10 @@ class AGUIProtocolHandler(BaseProtocolHandler):
                         tool_call_id=msg.get("tool_call_id", ""),
                     )
                 )
+            else:
+                result.append(
+                    message_cls(id=msg_id, role=role, content=content)
+                )
 
         return result
 
@@ -766,13 +1114,22 @@ class AGUIProtocolHandler(BaseProtocolHandler):
 
         Returns:
             合并后的事件数据
+
+        Note:
+            addition 与 event_data 没有重复字段且未设置 no_new_field 时，
+            深度合并等价于浅合并，直接返回 {**event_data, **addition}。
         """
         if not addition:
             return event_data
 
+        if not (
+            merge_options and merge_options.get("no_new_field")
+        ) and event_data.keys().isdisjoint(addition):
+            return {**event_data, **addition}
+
         return merge(event_data, addition, **(merge_options or {}))
 
-    async def _error_stream(self, message: str) -> AsyncIterator[str]:
+    async def _error_stream(self, message: str) -> AsyncIterator[bytes]:
         """生成错误事件流
 
         Args:
@@ -781,17 +1138,13 @@ class AGUIProtocolHandler(BaseProtocolHandler):
         Yields:
             SSE 格式的错误事件
         """
-        from ag_ui.core import RunErrorEvent, RunStartedEvent
-
-        thread_id = str(uuid.uuid4())
-        run_id = str(uuid.uuid4())
+        thread_id = _uuid4_str()
+        run_id = _uuid4_str()
 
         # 生命周期开始
-        yield self._encoder.encode(
-            RunStartedEvent(thread_id=thread_id, run_id=run_id)
-        )
+        yield _encode_run_started(thread_id, run_id)
 
         # 错误事件
-        yield self._encoder.encode(
+        yield self._encoder.encode_bytes(
             RunErrorEvent(message=message, code="REQUEST_ERROR")
         )
@@ -10,26 +10,140 @@
 """
 
 import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
 import inspect
+import itertools
+import os
+import time
 from typing import (
     Any,
     AsyncGenerator,
     AsyncIterator,
     Awaitable,
     cast,
+    Iterable,
     Iterator,
     List,
+    Optional,
+    Tuple,
     Union,
 )
-import uuid
+import weakref
+
+from agentrun.utils.log import logger
 
 from .model import AgentEvent, AgentRequest, EventType
 from .protocol import (
     AsyncInvokeAgentHandler,
     InvokeAgentHandler,
+    QueuedStream,
     SyncInvokeAgentHandler,
 )
 
+# 设置后，同步 handler 及同步迭代器使用该大小的共享线程池，
+# 而不是事件循环默认的线程池（默认最多 min(32, CPU 数 + 4) 个线程）
+THREAD_POOL_SIZE_ENV = "AGENTRUN_THREAD_POOL_SIZE"
+
+_shared_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_default_executor() -> Optional[Executor]:
+    """获取默认线程池
+
+    设置了 AGENTRUN_THREAD_POOL_SIZE 环境变量时返回按该大小创建的共享线程池，
+    否则返回 None（使用事件循环默认的线程池）。
+    线程池用于执行阻塞的同步调用（I/O），不适合 CPU 密集型任务。
+    """
+    global _shared_executor
+    if _shared_executor is None:
+        size = _get_thread_pool_size()
+        if size is None:
+            return None
+        _shared_executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="agent-invoke"
+        )
+    return _shared_executor
+
+
+def _get_thread_pool_size() -> Optional[int]:
+    """读取 AGENTRUN_THREAD_POOL_SIZE 环境变量
+
+    未设置时返回 None；取值不是正整数时记录警告并返回 None，
+    回退到事件循环默认的线程池，而不是在首个同步请求时抛出异常。
+    """
+    value = os.getenv(THREAD_POOL_SIZE_ENV, "").strip()
+    if not value:
+        return None
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size <= 0:
+        logger.warning(
+            "%s=%r 不是正整数，已忽略并使用事件循环默认的线程池",
+            THREAD_POOL_SIZE_ENV,
+            value,
+        )
+        return None
+    return size
+
+
+# 缺少 id 的 TOOL_CALL 使用的 ID：进程号和时间组成的前缀加自增计数，
+# 在进程内唯一，跨进程和重启不重复，无需为每个 ID 读取系统随机数
+_tool_call_id_prefix = ""
+_tool_call_counter = itertools.count()
+
+
+def _reset_tool_call_ids() -> None:
+    """重置工具调用 ID 前缀和计数（导入时及 fork 出的子进程中调用）"""
+    global _tool_call_id_prefix, _tool_call_counter
+    _tool_call_id_prefix = f"tc-{os.getpid():x}-{int(time.time()):x}-"
+    _tool_call_counter = itertools.count()
+
+
+_reset_tool_call_ids()
+if hasattr(os, "register_at_fork"):
+    # 预加载后 fork 的多个 worker 不能共用父进程的前缀和计数
+    os.register_at_fork(after_in_child=_reset_tool_call_ids)
+
+
+def _next_tool_call_id() -> str:
+    """生成工具调用 ID"""
+    # itertools.count 的 next 由 C 实现，在 CPython 中是原子操作，多线程安全
+    return f"{_tool_call_id_prefix}{next(_tool_call_counter):x}"
+
+
+# 可迭代但应作为单个结果处理的类型
+_NON_ITERATOR_TYPES = (str, bytes, dict, list, AgentEvent)
+
+# handler 返回值的迭代类型
+_NOT_ITERATOR = 0
+_SYNC_ITERATOR = 1
+_ASYNC_ITERATOR = 2
+
+# 按类型缓存迭代类型，同一类型的返回值只需探测一次；
+# 使用弱引用，动态创建的类型被回收后缓存项随之清除
+_ITER_KIND_CACHE: "weakref.WeakKeyDictionary[type, int]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _iter_kind(obj: Any) -> int:
+    """获取对象的迭代类型（_NOT_ITERATOR / _SYNC_ITERATOR / _ASYNC_ITERATOR）"""
+    obj_type = type(obj)
+    kind = _ITER_KIND_CACHE.get(obj_type)
+    if kind is None:
+        if issubclass(obj_type, _NON_ITERATOR_TYPES):
+            kind = _NOT_ITERATOR
+        elif hasattr(obj_type, "__aiter__"):
+            kind = _ASYNC_ITERATOR
+        elif hasattr(obj_type, "__iter__"):
+            kind = _SYNC_ITERATOR
+        else:
+            kind = _NOT_ITERATOR
+        _ITER_KIND_CACHE[obj_type] = kind
+    return kind
+
 
 class AgentInvoker:
     """Agent 调用器
@@ -55,17 +169,51 @@ class AgentInvoker:
         ...     print(event)  # AgentEvent 对象
     """
 
-    def __init__(self, invoke_agent: InvokeAgentHandler):
+    def __init__(
+        self,
+        invoke_agent: InvokeAgentHandler,
+        sync_batch_size: int = 1,
+        executor: Optional[Executor] = None,
+        inline_sync: bool = False,
+        stream_buffer_size: int = 0,
+    ):
         """初始化 Agent 调用器
 
         Args:
             invoke_agent: Agent 处理函数，可以是同步或异步
+            sync_batch_size: 同步迭代器每次在线程池中连续读取的元素个数。
+                大于 1 时可减少线程切换次数，但元素要攒够一批（或迭代结束）
+                才会输出，仅适合能快速连续产出元素的生成器
+            executor: 执行同步 handler 及同步迭代器的线程池，
+                为 None 时参见 AGENTRUN_THREAD_POOL_SIZE 环境变量
+            inline_sync: 为 True 时同步 handler 及其返回的同步迭代器直接在
+                事件循环线程中执行，省去线程切换。执行期间会阻塞事件循环，
+                仅适合不做阻塞 I/O、能很快完成的 handler
+            stream_buffer_size: 大于 0 时，invoke_stream 在 handler 的迭代器
+                与协议层之间放置该大小的缓冲队列，由独立任务预先读取元素，
+                使元素生成与序列化、网络写出并行；0 表示不缓冲
         """
         self.invoke_agent = invoke_agent
-        # 检测是否是异步函数或异步生成器
-        self.is_async = inspect.iscoroutinefunction(
-            invoke_agent
-        ) or inspect.isasyncgenfunction(invoke_agent)
+        self.sync_batch_size = max(1, sync_batch_size)
+        self.inline_sync = inline_sync
+        self.stream_buffer_size = stream_buffer_size
+        self._executor = (
+            executor if executor is not None else _get_default_executor()
+        )
+        # 检测是否是异步函数或异步生成器，并据此选定调用方式，
+        # 避免每次请求重复判断
+        if inspect.iscoroutinefunction(invoke_agent):
+            self.is_async = True
+            self._call_handler = self._call_coroutine_handler
+        elif inspect.isasyncgenfunction(invoke_agent):
+            self.is_async = True
+            self._call_handler = self._call_async_gen_handler
+        elif inline_sync:
+            self.is_async = False
+            self._call_handler = self._call_sync_handler_inline
+        else:
+            self.is_async = False
+            self._call_handler = self._call_sync_handler
 
     async def invoke(
         self, request: AgentRequest
@@ -89,6 +237,91 @@ class AgentInvoker:
         else:
             return self._wrap_non_stream(raw_result)
 
+    async def invoke_non_stream(
+        self, request: AgentRequest
+    ) -> List[AgentEvent]:
+        """调用 Agent 并收集全部结果
+
+        用于非流式请求。同步 handler 的调用及其返回的同步迭代器
+        在一次线程池调用中完成（参见 invoke_sync），无需逐个元素切换线程。
+
+        Args:
+            request: AgentRequest 请求对象
+
+        Returns:
+            AgentEvent 列表
+        """
+        if not self.is_async:
+            if self.inline_sync:
+                collected = self._collect_sync(request)
+            else:
+                loop = asyncio.get_running_loop()
+                collected = await loop.run_in_executor(
+                    self._executor, self._collect_sync, request
+                )
+            if isinstance(collected, list):
+                return collected
+            # 同步 handler 返回了异步迭代器，只能在事件循环中迭代
+            return [event async for event in self._wrap_stream(collected)]
+
+        results = await self.invoke(request)
+        if isinstance(results, list):
+            return results
+        return [event async for event in results]
+
+    def invoke_sync(self, request: AgentRequest) -> List[AgentEvent]:
+        """在当前线程中调用同步 handler 并收集全部结果
+
+        会阻塞当前线程直到 handler（及其返回的迭代器）执行完毕，
+        只能在允许阻塞的线程中调用，不要在事件循环中直接调用。
+
+        Args:
+            request: AgentRequest 请求对象
+
+        Returns:
+            AgentEvent 列表
+
+        Raises:
+            TypeError: handler 是异步函数或异步生成器，或返回了异步迭代器
+        """
+        if self.is_async:
+            raise TypeError("invoke_sync 仅支持同步的 invoke_agent")
+
+        collected = self._collect_sync(request)
+        if not isinstance(collected, list):
+            raise TypeError("invoke_sync 不支持返回异步迭代器的 invoke_agent")
+        return collected
+
+    def _collect_sync(
+        self, request: AgentRequest
+    ) -> Union[List[AgentEvent], AsyncIterator[Any]]:
+        """在当前线程中调用同步 handler 并收集结果
+
+        返回同步迭代器或非迭代器时收集为 AgentEvent 列表；
+        返回异步迭代器时无法在当前线程中迭代，原样返回。
+
+        Args:
+            request: AgentRequest 请求对象
+
+        Returns:
+            AgentEvent 列表，或 handler 返回的异步迭代器
+        """
+        sync_handler = cast(SyncInvokeAgentHandler, self.invoke_agent)
+        raw_result = sync_handler(request)
+
+        kind = _iter_kind(raw_result)
+        if kind == _ASYNC_ITERATOR:
+            return raw_result
+        if kind != _SYNC_ITERATOR:
+            return self._wrap_non_stream(raw_result)
+
+        results: List[AgentEvent] = []
+        convert_item = self._convert_item
+        extend = results.extend
+        for item in raw_result:
+            extend(convert_item(item))
+        return results
+
     async def invoke_stream(
         self, request: AgentRequest
     ) -> AsyncGenerator[AgentEvent, None]:
@@ -108,75 +341,86 @@ class AgentInvoker:
 
             if self._is_iterator(raw_result):
                 # 流式结果 - 逐个处理
-                async for item in self._iterate_async(raw_result):
-                    if item is None:
-                        continue
-
-                    if isinstance(item, str):
-                        if not item:  # 跳过空字符串
-                            continue
-                        yield AgentEvent(
-                            event=EventType.TEXT,
-                            data={"delta": item},
-                        )
-
-                    elif isinstance(item, AgentEvent):
-                        # 处理用户返回的事件
-                        for processed_event in self._process_user_event(item):
-                            yield processed_event
+                items = self._iterate_async(raw_result)
+                if self.stream_buffer_size > 0:
+                    items = self._buffered(items, self.stream_buffer_size)
+
+                convert_item = self._convert_item
+                try:
+                    async for item in items:
+                        for event in convert_item(item):
+                            yield event
+                finally:
+                    await items.aclose()
             else:
-                # 非流式结果
-                results = self._wrap_non_stream(raw_result)
-                for result in results:
-                    yield result
+                # 非流式结果，转换后逐个输出，不构建中间列表
+                for event in self._iter_non_stream(raw_result):
+                    yield event
 
         except Exception as e:
             # 发送错误事件
-            from agentrun.utils.log import logger
-
             logger.error(f"Agent 调用出错: {e}", exc_info=True)
             yield AgentEvent(
                 event=EventType.ERROR,
                 data={"message": str(e), "code": type(e).__name__},
             )
 
-    def _process_user_event(
-        self,
-        event: AgentEvent,
-    ) -> Iterator[AgentEvent]:
+    def _process_user_event(self, event: AgentEvent) -> AgentEvent:
         """处理用户返回的事件
 
         - TOOL_CALL 事件会被展开为 TOOL_CALL_CHUNK
-        - 其他事件直接传递
+        - 其他事件直接传递（不创建生成器，原样返回）
 
         Args:
             event: 用户返回的事件
 
-        Yields:
+        Returns:
             处理后的事件
         """
-        # 展开 TOOL_CALL 为 TOOL_CALL_CHUNK
-        if event.event == EventType.TOOL_CALL:
-            tool_id = event.data.get("id", str(uuid.uuid4()))
-            tool_name = event.data.get("name", "")
-            tool_args = event.data.get("args", "")
+        if event.event != EventType.TOOL_CALL:
+            return event
+
+        # 展开 TOOL_CALL 为 TOOL_CALL_CHUNK（包含名称和完整参数）
+        data = event.data
+        tool_id = data["id"] if "id" in data else _next_tool_call_id()
+        return AgentEvent(
+            event=EventType.TOOL_CALL_CHUNK,
+            data={
+                "id": tool_id,
+                "name": data.get("name", ""),
+                "args_delta": data.get("args", ""),
+            },
+        )
+
+    def _convert_item(self, item: Any) -> Iterable[AgentEvent]:
+        """将 handler 返回（或产出）的单个元素转换为 AgentEvent
+
+        - str: 转换为 TEXT 事件，空字符串被忽略
+        - AgentEvent: 交给 _process_user_event 处理（展开 TOOL_CALL）
+        - 其他（包括 None）: 忽略
 
-            # 发送包含名称的 chunk（首个 chunk 包含名称）
-            yield AgentEvent(
-                event=EventType.TOOL_CALL_CHUNK,
-                data={
-                    "id": tool_id,
-                    "name": tool_name,
-                    "args_delta": tool_args,
-                },
-            )
-            return
+        Args:
+            item: 单个元素
+
+        Returns:
+            转换后的事件
+        """
+        # 先按精确类型判断，子类实例再回退到 isinstance
+        item_type = type(item)
+        if item_type is str or (
+            item_type is not AgentEvent and isinstance(item, str)
+        ):
+            if not item:
+                return ()
+            return (AgentEvent(event=EventType.TEXT, data={"delta": item}),)
 
-        # 其他事件直接传递
-        yield event
+        if item_type is AgentEvent or isinstance(item, AgentEvent):
+            return (self._process_user_event(item),)
 
-    async def _call_handler(self, request: AgentRequest) -> Any:
-        """调用用户的 handler
+        return ()
+
+    async def _call_coroutine_handler(self, request: AgentRequest) -> Any:
+        """调用异步函数形式的 handler
 
         Args:
             request: AgentRequest 请求对象
@@ -184,22 +428,45 @@ class AgentInvoker:
         Returns:
             原始返回值
         """
-        if self.is_async:
-            async_handler = cast(AsyncInvokeAgentHandler, self.invoke_agent)
-            raw_result = async_handler(request)
+        async_handler = cast(AsyncInvokeAgentHandler, self.invoke_agent)
+        return await cast(Awaitable[Any], async_handler(request))
 
-            if inspect.isawaitable(raw_result):
-                result = await cast(Awaitable[Any], raw_result)
-            elif inspect.isasyncgen(raw_result):
-                result = raw_result
-            else:
-                result = raw_result
-        else:
-            sync_handler = cast(SyncInvokeAgentHandler, self.invoke_agent)
-            loop = asyncio.get_running_loop()
-            result = await loop.run_in_executor(None, sync_handler, request)
+    async def _call_async_gen_handler(self, request: AgentRequest) -> Any:
+        """调用异步生成器形式的 handler
+
+        Args:
+            request: AgentRequest 请求对象
+
+        Returns:
+            异步生成器
+        """
+        async_handler = cast(AsyncInvokeAgentHandler, self.invoke_agent)
+        return async_handler(request)
+
+    async def _call_sync_handler(self, request: AgentRequest) -> Any:
+        """在线程池中调用同步 handler
+
+        Args:
+            request: AgentRequest 请求对象
 
-        return result
+        Returns:
+            原始返回值
+        """
+        sync_handler = cast(SyncInvokeAgentHandler, self.invoke_agent)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, sync_handler, request)
+
+    async def _call_sync_handler_inline(self, request: AgentRequest) -> Any:
+        """在当前线程（事件循环线程）中直接调用同步 handler
+
+        Args:
+            request: AgentRequest 请求对象
+
+        Returns:
+            原始返回值
+        """
+        sync_handler = cast(SyncInvokeAgentHandler, self.invoke_agent)
+        return sync_handler(request)
 
     def _wrap_non_stream(self, result: Any) -> List[AgentEvent]:
         """包装非流式结果为 AgentEvent 列表
@@ -210,36 +477,34 @@ class AgentInvoker:
         Returns:
             AgentEvent 列表
         """
-        results: List[AgentEvent] = []
+        return list(self._iter_non_stream(result))
+
+    def _iter_non_stream(self, result: Any) -> Iterator[AgentEvent]:
+        """逐个转换非流式结果
 
+        Args:
+            result: 原始返回值
+
+        Yields:
+            AgentEvent: 事件结果
+        """
         if result is None:
-            return results
+            return
 
         if isinstance(result, str):
-            results.append(
-                AgentEvent(
-                    event=EventType.TEXT,
-                    data={"delta": result},
-                )
+            yield AgentEvent(
+                event=EventType.TEXT,
+                data={"delta": result},
             )
 
         elif isinstance(result, AgentEvent):
             # 处理可能的 TOOL_CALL 展开
-            results.extend(self._process_user_event(result))
+            yield self._process_user_event(result)
 
         elif isinstance(result, list):
+            convert_item = self._convert_item
             for item in result:
-                if isinstance(item, AgentEvent):
-                    results.extend(self._process_user_event(item))
-                elif isinstance(item, str) and item:
-                    results.append(
-                        AgentEvent(
-                            event=EventType.TEXT,
-                            data={"delta": item},
-                        )
-                    )
-
-        return results
+                yield from convert_item(item)
 
     async def _wrap_stream(
         self, iterator: Any
@@ -252,28 +517,19 @@ class AgentInvoker:
         Yields:
             AgentEvent: 事件结果
         """
+        convert_item = self._convert_item
         async for item in self._iterate_async(iterator):
-            if item is None:
-                continue
-
-            if isinstance(item, str):
-                if not item:
-                    continue
-                yield AgentEvent(
-                    event=EventType.TEXT,
-                    data={"delta": item},
-                )
-
-            elif isinstance(item, AgentEvent):
-                for processed_event in self._process_user_event(item):
-                    yield processed_event
+            for event in convert_item(item):
+                yield event
 
     async def _iterate_async(
         self, content: Union[Iterator[Any], AsyncIterator[Any]]
     ) -> AsyncGenerator[Any, None]:
         """统一迭代同步和异步迭代器
 
-        对于同步迭代器，每次 next() 调用都在线程池中执行，避免阻塞事件循环。
+        对于同步迭代器，next() 调用在线程池中执行，避免阻塞事件循环；
+        每次在线程池中最多连续读取 sync_batch_size 个元素。
+        设置了 inline_sync 时直接在当前线程中迭代。
 
         Args:
             content: 迭代器
@@ -281,29 +537,75 @@ class AgentInvoker:
         Yields:
             迭代器中的元素
         """
-        if hasattr(content, "__aiter__"):
-            async for chunk in content:
+        if _iter_kind(content) == _ASYNC_ITERATOR:
+            try:
+                async for chunk in content:
+                    yield chunk
+            finally:
+                # 提前结束时关闭上游生成器，使其 finally 及时执行
+                aclose = getattr(content, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        elif self.inline_sync:
+            for chunk in content:
                 yield chunk
         else:
             loop = asyncio.get_running_loop()
             iterator = iter(content)
-
+            batch_size = self.sync_batch_size
             _STOP = object()
 
-            def _safe_next() -> Any:
+            def _drain_batch() -> Tuple[List[Any], bool, Optional[Exception]]:
+                """读取一批元素，返回 (元素列表, 是否结束, 迭代中抛出的异常)"""
+                items: List[Any] = []
+                append = items.append
                 try:
-                    return next(iterator)
-                except StopIteration:
-                    return _STOP
+                    for _ in range(batch_size):
+                        # 使用 next 的默认值判断结束，避免逐个元素处理 StopIteration
+                        item = next(iterator, _STOP)
+                        if item is _STOP:
+                            return items, True, None
+                        append(item)
+                except Exception as e:
+                    # 先输出异常前已读取的元素，再抛出异常
+                    return items, True, e
+                return items, False, None
 
             while True:
-                chunk = await loop.run_in_executor(None, _safe_next)
-                if chunk is _STOP:
+                items, done, error = await loop.run_in_executor(
+                    self._executor, _drain_batch
+                )
+                for chunk in items:
+                    yield chunk
+                if error is not None:
+                    raise error
+                if done:
                     break
-                yield chunk
+
+    async def _buffered(
+        self, source: AsyncIterator[Any], maxsize: int
+    ) -> AsyncGenerator[Any, None]:
+        """通过有界队列预先读取异步迭代器
+
+        独立任务持续读取 source 并放入队列（队列满时等待），
+        消费方读取较慢时上游仍可继续生成，直到填满缓冲。
+        source 抛出的异常在其之前的元素输出后重新抛出；
+        消费方提前结束时取消读取任务，并关闭 source。
+
+        Args:
+            source: 上游异步迭代器
+            maxsize: 队列大小
+
+        Yields:
+            source 中的元素
+        """
+        stream = QueuedStream(source, maxsize)
+        try:
+            async for item in stream:
+                yield item
+        finally:
+            await stream.aclose()
 
     def _is_iterator(self, obj: Any) -> bool:
         """检查对象是否是迭代器"""
-        if isinstance(obj, (str, bytes, dict, list, AgentEvent)):
-            return False
-        return hasattr(obj, "__iter__") or hasattr(obj, "__aiter__")
+        return _iter_kind(obj) != _NOT_ITERATOR
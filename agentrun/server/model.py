@@ -30,8 +30,20 @@ from ..utils.model import BaseModel, Field
 
 
 class ProtocolConfig(BaseModel):
+    """协议通用配置
+
+    Attributes:
+        prefix: 协议路由前缀
+        enable: 是否启用协议
+        batch_bytes: SSE 帧合并阈值（字节数），缓冲达到该大小时立即写出；
+            0 表示不合并，每个事件单独写出
+        batch_max_wait_ms: 开启合并时，缓冲中的帧最长等待时间（毫秒）
+    """
+
     prefix: Optional[str] = None
     enable: bool = True
+    batch_bytes: int = 0
+    batch_max_wait_ms: float = 10.0
 
 
 class AGUIProtocolConfig(ProtocolConfig):
@@ -40,6 +52,9 @@ class AGUIProtocolConfig(ProtocolConfig):
     Attributes:
         prefix: 协议路由前缀，默认 "/ag-ui/agent"
         enable: 是否启用协议
+        batch_bytes: SSE 帧合并阈值（字节数），缓冲达到该大小时立即写出；
+            0 表示不合并，每个事件单独写出
+        batch_max_wait_ms: 开启合并时，缓冲中的帧最长等待时间（毫秒）
     """
 
     enable: bool = True
@@ -47,9 +62,30 @@ class AGUIProtocolConfig(ProtocolConfig):
 
 
 class ServerConfig(BaseModel):
+    """服务器配置
+
+    Attributes:
+        openai: OpenAI 协议配置
+        agui: AG-UI 协议配置
+        cors_origins: CORS 允许的源列表
+        stream_buffer_size: 流式响应中 Agent 最多可领先协议输出的事件数；
+            大于 0 时 Agent 的输出在后台任务中读取并放入有界队列，
+            使 Agent 生成与网络发送重叠；0 表示不缓冲
+        inline_sync: 为 True 时同步 invoke_agent 直接在事件循环线程中执行，
+            省去线程切换；执行期间会阻塞事件循环，仅适合不做阻塞 I/O 的 Agent
+        sync_batch_size: 同步生成器每次在线程池中连续读取的元素个数；
+            大于 1 时减少线程切换，但元素攒够一批才会输出
+        thread_pool_size: 执行同步 Agent 的线程池大小；为 None 时参见
+            AGENTRUN_THREAD_POOL_SIZE 环境变量
+    """
+
     openai: Optional["OpenAIProtocolConfig"] = None
     agui: Optional["AGUIProtocolConfig"] = None
     cors_origins: Optional[List[str]] = None
+    stream_buffer_size: int = 0
+    inline_sync: bool = False
+    sync_batch_size: int = 1
+    thread_pool_size: Optional[int] = None
 
 
 # ============================================================================
@@ -386,7 +422,15 @@ class AgentRequest(BaseModel):
 
 
 class OpenAIProtocolConfig(ProtocolConfig):
-    """OpenAI 协议配置"""
+    """OpenAI 协议配置
+
+    Attributes:
+        prefix: 协议路由前缀，默认 "/openai/v1"
+        enable: 是否启用协议
+        model_name: 默认模型名称
+        batch_bytes: SSE 帧合并阈值（字节数），0 表示不合并
+        batch_max_wait_ms: 开启合并时，缓冲中的帧最长等待时间（毫秒）
+    """
 
     enable: bool = True
     prefix: Optional[str] = "/openai/v1"
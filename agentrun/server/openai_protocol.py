@@ -6,14 +6,22 @@
 本实现将 AgentResult 事件转换为 OpenAI 流式响应格式。
 """
 
-import json
+from dataclasses import dataclass, field
+import secrets
 import time
-from typing import Any, AsyncIterator, Dict, List, Optional, TYPE_CHECKING
-import uuid
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TYPE_CHECKING,
+)
 
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-import pydash
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import orjson
 
 from ..utils.helper import merge, MergeOptions
 from .model import (
@@ -27,18 +35,91 @@ from .model import (
     Tool,
     ToolCall,
 )
-from .protocol import BaseProtocolHandler
+from .protocol import BaseProtocolHandler, batch_frames
 
 if TYPE_CHECKING:
     from .invoker import AgentInvoker
 
 
+# ============================================================================
+# 非流式响应累积状态
+# ============================================================================
+
+
+@dataclass
+class NonStreamState:
+    """非流式响应的累积状态
+
+    逐个接收 AgentEvent，累积文本内容和工具调用。
+    """
+
+    content_parts: List[str] = field(default_factory=list)
+    # 工具调用状态：{tool_id: {id, type, function: {name, arguments}}}
+    tool_call_map: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def add(self, event: AgentEvent) -> None:
+        """累积单个事件
+
+        Args:
+            event: AgentEvent 事件
+        """
+        kind = event.event
+        if kind == EventType.TEXT:
+            self.content_parts.append(event.data.get("delta", ""))
+
+        elif kind == EventType.TOOL_CALL_CHUNK:
+            tool_id = event.data.get("id", "")
+            if not tool_id:
+                return
+
+            tool_call = self.tool_call_map.get(tool_id)
+            if tool_call is None:
+                tool_call = self.tool_call_map[tool_id] = {
+                    "id": tool_id,
+                    "type": "function",
+                    "function": {
+                        "name": event.data.get("name", ""),
+                        "arguments": "",
+                    },
+                }
+
+            args_delta = event.data.get("args_delta", "")
+            if args_delta:
+                tool_call["function"]["arguments"] += args_delta
+
+
 # ============================================================================
 # OpenAI 协议处理器
 # ============================================================================
 
 
 DEFAULT_PREFIX = "/openai/v1"
+DEFAULT_MODEL_NAME = "agentrun"
+
+# 角色字符串到 MessageRole 的映射，避免逐条消息调用枚举构造
+_MESSAGE_ROLES: Dict[str, MessageRole] = {
+    role.value: role for role in MessageRole
+}
+
+# 序列化 delta 时的 orjson 选项：addition 等用户数据中可能有非 str 键，
+# 与 json.dumps 一样将其转为字符串，而不是在流中途抛出异常
+_DUMPS_OPTION = orjson.OPT_NON_STR_KEYS
+
+# 流结束标记，预先编码为 bytes
+_DONE = b"data: [DONE]\n\n"
+
+# 流式响应块中 delta 之后的固定部分（finish_reason 为 null）
+_CHUNK_SUFFIX = b',"finish_reason":null}]}\n\n'
+
+# 工具调用参数增量块中 delta 及之后的部分，依次填入工具调用索引和
+# orjson 编码后的参数增量
+_TOOL_CALL_ARGS_CHUNK_TEMPLATE = (
+    b'{"tool_calls":[{"index":%d,"function":{"arguments":%s}}]}' + _CHUNK_SUFFIX
+)
+
+# 流结束时的 finish_reason 块中 delta 及之后的部分（delta 为空对象）
+_FINISH_STOP_SUFFIX = b'{},"finish_reason":"stop"}]}\n\n'
+_FINISH_TOOL_CALLS_SUFFIX = b'{},"finish_reason":"tool_calls"}]}\n\n'
 
 
 class OpenAIProtocolHandler(BaseProtocolHandler):
@@ -74,14 +155,26 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
 
     def __init__(self, config: Optional[ServerConfig] = None):
         self.config = config.openai if config else None
+        # SSE 帧合并配置（batch_bytes <= 0 表示不合并）
+        self._batch_bytes = self.config.batch_bytes if self.config else 0
+        self._batch_max_wait = (
+            self.config.batch_max_wait_ms / 1000 if self.config else 0.0
+        )
+        # 配置在处理器生命周期内不变，前缀和模型名称只需解析一次
+        prefix = self.config.prefix if self.config is not None else None
+        self._prefix: str = prefix if prefix is not None else DEFAULT_PREFIX
+        model_name = self.config.model_name if self.config is not None else None
+        self._model_name: str = (
+            model_name if model_name is not None else DEFAULT_MODEL_NAME
+        )
 
     def get_prefix(self) -> str:
         """OpenAI 协议建议使用 /openai/v1 前缀"""
-        return pydash.get(self.config, "prefix", DEFAULT_PREFIX)
+        return self._prefix
 
     def get_model_name(self) -> str:
         """获取默认模型名称"""
-        return pydash.get(self.config, "model_name", "agentrun")
+        return self._model_name
 
     def as_fastapi_router(self, agent_invoker: "AgentInvoker") -> APIRouter:
         """创建 OpenAI 协议的 FastAPI Router"""
@@ -97,7 +190,7 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
             }
 
             try:
-                request_data = await request.json()
+                request_data = orjson.loads(await request.body())
                 agent_request, context = await self.parse_request(
                     request, request_data
                 )
@@ -108,6 +201,12 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
                         agent_invoker.invoke_stream(agent_request),
                         context,
                     )
+                    if self._batch_bytes > 0:
+                        event_stream = batch_frames(
+                            event_stream,
+                            self._batch_bytes,
+                            self._batch_max_wait,
+                        )
                     return StreamingResponse(
                         event_stream,
                         media_type="text/event-stream",
@@ -115,15 +214,20 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
                     )
                 else:
                     # 非流式响应
-                    results = await agent_invoker.invoke(agent_request)
-                    if hasattr(results, "__aiter__"):
-                        # 收集流式结果
-                        result_list = []
-                        async for r in results:
-                            result_list.append(r)
-                        results = result_list
-
-                    formatted = self._format_non_stream(results, context)
+                    if agent_invoker.is_async:
+                        # 异步 handler 返回的事件流边迭代边累积，不生成中间列表
+                        results = await agent_invoker.invoke(agent_request)
+                    else:
+                        results = await agent_invoker.invoke_non_stream(
+                            agent_request
+                        )
+
+                    if isinstance(results, list):
+                        formatted = self._format_non_stream(results, context)
+                    else:
+                        formatted = await self._format_non_stream_async(
+                            results, context
+                        )
                     return JSONResponse(formatted)
 
             except ValueError as e:
@@ -142,18 +246,22 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
                     status_code=500,
                 )
 
+        # 模型列表在处理器生命周期内不变，创建路由时序列化一次，
+        # created 为路由创建（服务启动）时间
+        models_body = orjson.dumps({
+            "object": "list",
+            "data": [{
+                "id": self.get_model_name(),
+                "object": "model",
+                "created": int(time.time()),
+                "owned_by": "agentrun",
+            }],
+        })
+
         @router.get("/models")
         async def list_models():
             """列出可用模型"""
-            return {
-                "object": "list",
-                "data": [{
-                    "id": self.get_model_name(),
-                    "object": "model",
-                    "created": int(time.time()),
-                    "owned_by": "agentrun",
-                }],
-            }
+            return Response(content=models_body, media_type="application/json")
 
         return router
 
@@ -177,7 +285,8 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
 
         # 创建上下文
         context = {
-            "response_id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            # 12 位随机十六进制，token_hex 无需构造 UUID 对象
+            "response_id": f"chatcmpl-{secrets.token_hex(6)}",
             "model": request_data.get("model", self.get_model_name()),
             "created": int(time.time()),
         }
@@ -219,12 +328,14 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
             if "role" not in msg_data:
                 raise ValueError("Message missing 'role' field")
 
-            try:
-                role = MessageRole(msg_data["role"])
-            except ValueError as e:
-                raise ValueError(
-                    f"Invalid message role: {msg_data['role']}"
-                ) from e
+            raw_role = msg_data["role"]
+            role = (
+                _MESSAGE_ROLES.get(raw_role)
+                if isinstance(raw_role, str)
+                else None
+            )
+            if role is None:
+                raise ValueError(f"Invalid message role: {raw_role}")
 
             # 解析 tool_calls
             tool_calls = None
@@ -282,7 +393,7 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
         self,
         event_stream: AsyncIterator[AgentEvent],
         context: Dict[str, Any],
-    ) -> AsyncIterator[str]:
+    ) -> AsyncIterator[bytes]:
         """将 AgentEvent 流转换为 OpenAI SSE 格式
 
         自动生成边界事件：
@@ -295,28 +406,27 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
             context: 上下文信息
 
         Yields:
-            SSE 格式的字符串
+            SSE 格式的字节串
         """
         # 状态追踪
         sent_role = False
         has_text = False
         tool_call_index = -1  # 从 -1 开始，第一个工具调用时变为 0
-        # 工具调用状态：{tool_id: {"started": bool, "index": int}}
-        tool_call_states: Dict[str, Dict[str, Any]] = {}
+        # 已开始的工具调用：{tool_id: index}
+        tool_call_indexes: Dict[str, int] = {}
         has_tool_calls = False
+        # id / created / model 在整个流中不变，只序列化一次
+        prefix = self._build_chunk_prefix(context)
+        # AgentEvent.event 保存的是枚举值字符串，提前取出避免循环内查找枚举
+        text_event = EventType.TEXT.value
+        tool_call_chunk_event = EventType.TOOL_CALL_CHUNK.value
+        raw_event = EventType.RAW.value
 
         async for event in event_stream:
-            # RAW 事件直接透传
-            if event.event == EventType.RAW:
-                raw = event.data.get("raw", "")
-                if raw:
-                    if not raw.endswith("\n\n"):
-                        raw = raw.rstrip("\n") + "\n\n"
-                    yield raw
-                continue
+            kind = event.event
 
             # TEXT 事件
-            if event.event == EventType.TEXT:
+            if kind == text_event:
                 delta: Dict[str, Any] = {}
                 # 首个 TEXT 事件，发送 role
                 if not sent_role:
@@ -336,114 +446,147 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
                             event.addition_merge_options,
                         )
 
-                    yield self._build_chunk(context, delta)
+                    yield (
+                        prefix
+                        + orjson.dumps(delta, option=_DUMPS_OPTION)
+                        + _CHUNK_SUFFIX
+                    )
                 continue
 
             # TOOL_CALL_CHUNK 事件
-            if event.event == EventType.TOOL_CALL_CHUNK:
-                tool_id = event.data.get("id", "")
-                tool_name = event.data.get("name", "")
-                args_delta = event.data.get("args_delta", "")
-
-                delta = {}
+            if kind == tool_call_chunk_event:
+                data = event.data
+                tool_id = data.get("id", "")
+                args_delta = data.get("args_delta", "")
 
                 # 首次见到这个工具调用
-                if tool_id and tool_id not in tool_call_states:
+                if tool_id and tool_id not in tool_call_indexes:
                     tool_call_index += 1
-                    tool_call_states[tool_id] = {
-                        "started": True,
-                        "index": tool_call_index,
-                    }
+                    tool_call_indexes[tool_id] = tool_call_index
                     has_tool_calls = True
 
                     # 发送工具调用开始（包含 id, name）
-                    delta["tool_calls"] = [{
-                        "index": tool_call_index,
-                        "id": tool_id,
-                        "type": "function",
-                        "function": {"name": tool_name, "arguments": ""},
-                    }]
-                    yield self._build_chunk(context, delta)
-                    delta = {}
+                    start_delta = {
+                        "tool_calls": [{
+                            "index": tool_call_index,
+                            "id": tool_id,
+                            "type": "function",
+                            "function": {
+                                "name": data.get("name", ""),
+                                "arguments": "",
+                            },
+                        }]
+                    }
+                    yield (
+                        prefix
+                        + orjson.dumps(start_delta, option=_DUMPS_OPTION)
+                        + _CHUNK_SUFFIX
+                    )
 
                 # 发送参数增量
                 if args_delta:
-                    current_index = tool_call_states.get(tool_id, {}).get(
-                        "index", tool_call_index
+                    current_index = tool_call_indexes.get(
+                        tool_id, tool_call_index
                     )
-                    delta["tool_calls"] = [{
-                        "index": current_index,
-                        "function": {"arguments": args_delta},
-                    }]
 
-                    # 应用 addition
                     if event.addition:
+                        # 应用 addition
                         delta = self._apply_addition(
-                            delta,
+                            {
+                                "tool_calls": [{
+                                    "index": current_index,
+                                    "function": {"arguments": args_delta},
+                                }]
+                            },
                             event.addition,
                             event.addition_merge_options,
                         )
-
-                    yield self._build_chunk(context, delta)
-                continue
-
-            # TOOL_RESULT 事件：OpenAI 协议通常不在流中输出工具结果
-            if event.event == EventType.TOOL_RESULT:
-                continue
-
-            # TOOL_RESULT_CHUNK 事件：OpenAI 协议不支持流式工具输出
-            if event.event == EventType.TOOL_RESULT_CHUNK:
+                        yield (
+                            prefix
+                            + orjson.dumps(delta, option=_DUMPS_OPTION)
+                            + _CHUNK_SUFFIX
+                        )
+                    else:
+                        # 结构固定，直接填充模板，无需构造嵌套字典
+                        yield prefix + _TOOL_CALL_ARGS_CHUNK_TEMPLATE % (
+                            current_index,
+                            orjson.dumps(args_delta, option=_DUMPS_OPTION),
+                        )
                 continue
 
-            # HITL 事件：OpenAI 协议不支持
-            if event.event == EventType.HITL:
+            # RAW 事件直接透传
+            if kind == raw_event:
+                raw = event.data.get("raw", "")
+                if raw:
+                    if not raw.endswith("\n\n"):
+                        raw = raw.rstrip("\n") + "\n\n"
+                    yield raw.encode("utf-8")
                 continue
 
-            # 其他事件忽略
-            # (ERROR, STATE, CUSTOM 等不直接映射到 OpenAI 格式)
+            # 其他事件忽略：
+            # - TOOL_RESULT / TOOL_RESULT_CHUNK：OpenAI 协议不在流中输出工具结果
+            # - HITL：OpenAI 协议不支持
+            # - ERROR, STATE, CUSTOM 等不直接映射到 OpenAI 格式
 
         # 流结束后发送 finish_reason 和 [DONE]
         if has_tool_calls:
-            yield self._build_chunk(context, {}, finish_reason="tool_calls")
+            yield prefix + _FINISH_TOOL_CALLS_SUFFIX
         elif has_text:
-            yield self._build_chunk(context, {}, finish_reason="stop")
-        yield "data: [DONE]\n\n"
+            yield prefix + _FINISH_STOP_SUFFIX
+        yield _DONE
 
     def _build_chunk(
         self,
         context: Dict[str, Any],
         delta: Dict[str, Any],
         finish_reason: Optional[str] = None,
-    ) -> str:
+    ) -> bytes:
         """构建 OpenAI 流式响应块
 
+        使用 orjson 序列化并直接返回 UTF-8 字节，
+        StreamingResponse 无需再对字符串做一次编码。
+
         Args:
             context: 上下文信息
             delta: delta 数据
             finish_reason: 结束原因
 
         Returns:
-            SSE 格式的字符串
+            SSE 格式的字节串
         """
-        chunk = {
-            "id": context.get(
-                "response_id", f"chatcmpl-{uuid.uuid4().hex[:8]}"
-            ),
-            "object": "chat.completion.chunk",
-            "created": context.get("created", int(time.time())),
-            "model": context.get("model", "agentrun"),
-            "choices": [{
-                "index": 0,
-                "delta": delta,
-                "finish_reason": finish_reason,
-            }],
-        }
-        json_str = json.dumps(chunk, ensure_ascii=False)
-        return f"data: {json_str}\n\n"
+        return (
+            self._build_chunk_prefix(context)
+            + orjson.dumps(delta, option=_DUMPS_OPTION)
+            + b',"finish_reason":'
+            + orjson.dumps(finish_reason)
+            + b"}]}\n\n"
+        )
+
+    def _build_chunk_prefix(self, context: Dict[str, Any]) -> bytes:
+        """构建流式响应块中 delta 之前的固定部分
+
+        与 json 序列化完整响应块的结果一致，拼接 delta 及 finish_reason
+        即可得到完整的 SSE 数据帧。
+
+        Args:
+            context: 上下文信息
+
+        Returns:
+            以 `"delta":` 结尾的 SSE 数据帧前缀
+        """
+        return (
+            b'data: {"id":%s,"object":"chat.completion.chunk",'
+            b'"created":%s,"model":%s,"choices":[{"index":0,"delta":'
+            % (
+                orjson.dumps(context["response_id"]),
+                orjson.dumps(context["created"]),
+                orjson.dumps(context["model"]),
+            )
+        )
 
     def _format_non_stream(
         self,
-        events: List[AgentEvent],
+        events: Iterable[AgentEvent],
         context: Dict[str, Any],
     ) -> Dict[str, Any]:
         """将 AgentEvent 列表转换为 OpenAI 非流式响应
@@ -457,37 +600,51 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
         Returns:
             OpenAI 格式的响应字典
         """
-        content_parts: List[str] = []
-        # 工具调用状态：{tool_id: {id, name, arguments}}
-        tool_call_map: Dict[str, Dict[str, Any]] = {}
-        has_tool_calls = False
-
+        state = NonStreamState()
         for event in events:
-            if event.event == EventType.TEXT:
-                content_parts.append(event.data.get("delta", ""))
+            state.add(event)
+        return self._build_non_stream_response(state, context)
 
-            elif event.event == EventType.TOOL_CALL_CHUNK:
-                tool_id = event.data.get("id", "")
-                tool_name = event.data.get("name", "")
-                args_delta = event.data.get("args_delta", "")
+    async def _format_non_stream_async(
+        self,
+        events: AsyncIterator[AgentEvent],
+        context: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """边迭代 AgentEvent 流边累积，转换为 OpenAI 非流式响应
 
-                if tool_id:
-                    if tool_id not in tool_call_map:
-                        tool_call_map[tool_id] = {
-                            "id": tool_id,
-                            "type": "function",
-                            "function": {"name": tool_name, "arguments": ""},
-                        }
-                        has_tool_calls = True
+        不需要先把事件收集到列表中。
+
+        Args:
+            events: AgentEvent 流
+            context: 上下文信息
+
+        Returns:
+            OpenAI 格式的响应字典
+        """
+        state = NonStreamState()
+        async for event in events:
+            state.add(event)
+        return self._build_non_stream_response(state, context)
 
-                    if args_delta:
-                        tool_call_map[tool_id]["function"][
-                            "arguments"
-                        ] += args_delta
+    def _build_non_stream_response(
+        self,
+        state: NonStreamState,
+        context: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """根据累积状态构建 OpenAI 非流式响应
+
+        Args:
+            state: 非流式响应累积状态
+            context: 上下文信息
+
+        Returns:
+            OpenAI 格式的响应字典
+        """
+        content_parts = state.content_parts
+        tool_call_map = state.tool_call_map
 
-        # 构建响应
         content = "".join(content_parts) if content_parts else None
-        finish_reason = "tool_calls" if has_tool_calls else "stop"
+        finish_reason = "tool_calls" if tool_call_map else "stop"
 
         message: Dict[str, Any] = {
             "role": "assistant",
@@ -498,12 +655,10 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
             message["tool_calls"] = list(tool_call_map.values())
 
         response = {
-            "id": context.get(
-                "response_id", f"chatcmpl-{uuid.uuid4().hex[:12]}"
-            ),
+            "id": context["response_id"],
             "object": "chat.completion",
-            "created": context.get("created", int(time.time())),
-            "model": context.get("model", "agentrun"),
+            "created": context["created"],
+            "model": context["model"],
             "choices": [{
                 "index": 0,
                 "message": message,
@@ -528,8 +683,17 @@ class OpenAIProtocolHandler(BaseProtocolHandler):
 
         Returns:
             合并后的 delta 数据
+
+        Note:
+            addition 与 delta 没有重复字段且未设置 no_new_field 时，
+            深度合并等价于浅合并，直接返回 {**delta, **addition}。
         """
         if not addition:
             return delta
 
+        if not (
+            merge_options and merge_options.get("no_new_field")
+        ) and delta.keys().isdisjoint(addition):
+            return {**delta, **addition}
+
         return merge(delta, addition, **(merge_options or {}))
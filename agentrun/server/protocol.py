@@ -9,7 +9,18 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Any, Awaitable, Callable, Dict, TYPE_CHECKING, Union
+import asyncio
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Union,
+)
 
 from .model import AgentRequest, AgentReturnType
 
@@ -125,6 +136,201 @@ class BaseProtocolHandler(ProtocolHandler):
         ) or hasattr(obj, "__aiter__")
 
 
+# ============================================================================
+# 异步流预读取与 SSE 帧合并
+# ============================================================================
+
+
+# 队列中表示读取任务已结束的标记
+_STREAM_DONE = object()
+
+# QueuedStream.get 等待超时的返回值
+STREAM_TIMEOUT = object()
+
+
+class QueuedStream:
+    """在单个后台任务中读取异步迭代器，并通过有界队列交给消费方
+
+    上游的每一步都在同一个任务（同一份 contextvars 上下文）中执行，
+    上游中设置的 ContextVar 在后续步骤中依然可见。
+
+    - 上游结束后，队列中的元素读完即结束迭代（StopAsyncIteration）
+    - 上游抛出的异常在其之前的元素读完后原样抛出；
+      读取任务以 BaseException（包括被取消）结束时同样会唤醒消费方
+    - 读取任务结束（包括被取消）时会调用上游的 aclose()，
+      使上游生成器的 finally 及时执行
+    - 消费方用完后必须调用 aclose()，以取消尚未结束的读取任务
+
+    Example:
+        >>> stream = QueuedStream(source, maxsize=16)
+        >>> try:
+        ...     async for item in stream:
+        ...         ...
+        ... finally:
+        ...     await stream.aclose()
+    """
+
+    def __init__(self, source: AsyncIterator[Any], maxsize: int = 0):
+        """初始化并启动读取任务
+
+        Args:
+            source: 上游异步迭代器
+            maxsize: 队列大小，0 表示不限制
+        """
+        self._source = source
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize)
+        self._producer = asyncio.ensure_future(self._produce())
+        self._producer.add_done_callback(self._on_producer_done)
+
+    async def _produce(self) -> None:
+        """读取上游元素并放入队列"""
+        source = self._source
+        put = self._queue.put
+        try:
+            async for item in source:
+                await put(item)
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _on_producer_done(self, _task: "asyncio.Future[None]") -> None:
+        """读取任务结束时放入结束标记，唤醒等待中的消费方
+
+        队列已满时消费方不会阻塞在 get 上，读完队列后会直接检查任务状态。
+        """
+        if not self._queue.full():
+            self._queue.put_nowait(_STREAM_DONE)
+
+    def _finish(self) -> None:
+        """读取任务已结束：按任务结果抛出异常或结束迭代"""
+        # 读取任务失败或被取消时，result() 抛出对应异常
+        self._producer.result()
+        raise StopAsyncIteration
+
+    async def get(self, timeout: Optional[float] = None) -> Any:
+        """读取下一个元素
+
+        Args:
+            timeout: 队列为空时的最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            下一个元素；等待超时时返回 STREAM_TIMEOUT
+
+        Raises:
+            StopAsyncIteration: 上游已结束且队列已读完
+            Exception: 上游抛出的异常
+        """
+        queue = self._queue
+        if not queue.empty():
+            item = queue.get_nowait()
+        elif self._producer.done():
+            self._finish()
+        elif timeout is None:
+            item = await queue.get()
+        elif timeout <= 0:
+            return STREAM_TIMEOUT
+        else:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return STREAM_TIMEOUT
+
+        if item is _STREAM_DONE:
+            self._finish()
+        return item
+
+    def __aiter__(self) -> "QueuedStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.get()
+
+    async def aclose(self) -> None:
+        """取消尚未结束的读取任务并等待其结束（包括上游的 aclose）"""
+        producer = self._producer
+        if not producer.done():
+            producer.cancel()
+        await asyncio.wait((producer,))
+        if not producer.cancelled():
+            # 标记异常已被读取，避免提前结束时输出 "never retrieved" 警告
+            producer.exception()
+
+
+# 合并 SSE 帧时预读取的最大帧数
+_BATCH_PREFETCH_FRAMES = 64
+
+
+async def batch_frames(
+    frames: AsyncIterator[bytes],
+    max_bytes: int,
+    max_wait: float,
+    flush_prefix: Optional[bytes] = None,
+) -> AsyncIterator[bytes]:
+    """将多个小的 SSE 帧合并为较大的写出块
+
+    上游帧流在单个后台任务中读取（参见 QueuedStream）。
+    缓冲中的帧在以下任一条件满足时写出：
+    - 缓冲大小（字节数）达到 max_bytes
+    - 最早缓冲的帧已等待 max_wait 秒（上游暂时没有新帧时也会按时写出）
+    - 遇到以 flush_prefix 开头的帧（如错误帧）或上游结束
+    - 上游抛出异常（先写出缓冲，再重新抛出异常）
+
+    Args:
+        frames: SSE 帧流
+        max_bytes: 缓冲写出阈值
+        max_wait: 帧在缓冲中的最长等待时间（秒）
+        flush_prefix: 以该前缀开头的帧写入缓冲后立即写出
+
+    Yields:
+        合并后的 SSE 数据
+    """
+    loop = asyncio.get_running_loop()
+    stream = QueuedStream(frames, _BATCH_PREFETCH_FRAMES)
+    buffer: List[bytes] = []
+    size = 0
+    deadline = 0.0
+
+    try:
+        while True:
+            try:
+                if buffer:
+                    frame = await stream.get(deadline - loop.time())
+                else:
+                    frame = await stream.get()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # 先写出异常前已缓冲的帧，再抛出异常
+                if buffer:
+                    yield b"".join(buffer)
+                    buffer.clear()
+                raise
+
+            if frame is STREAM_TIMEOUT:
+                yield b"".join(buffer)
+                buffer.clear()
+                size = 0
+                continue
+
+            if not buffer:
+                deadline = loop.time() + max_wait
+            buffer.append(frame)
+            size += len(frame)
+
+            if size >= max_bytes or (
+                flush_prefix is not None and frame.startswith(flush_prefix)
+            ):
+                yield b"".join(buffer)
+                buffer.clear()
+                size = 0
+
+        if buffer:
+            yield b"".join(buffer)
+    finally:
+        await stream.aclose()
+
+
 # ============================================================================
 # Handler 类型定义
 # ============================================================================
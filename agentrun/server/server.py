@@ -6,9 +6,12 @@
 - 支持多协议同时运行（OpenAI + AG-UI）
 """
 
-from typing import Any, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, List, Optional, Sequence
 
 from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from agentrun.utils.log import logger
@@ -105,11 +108,29 @@ class AgentRunServer:
 
             config: 服务器配置
                 - cors_origins: CORS 允许的源列表
+                - stream_buffer_size: 流式响应缓冲的事件数
+                - inline_sync: 同步 Agent 是否在事件循环线程中执行
+                - sync_batch_size: 同步生成器每批读取的元素个数
+                - thread_pool_size: 执行同步 Agent 的线程池大小
                 - openai: OpenAI 协议配置
                 - agui: AG-UI 协议配置
         """
-        self.app = FastAPI(title="AgentRun Server")
-        self.agent_invoker = AgentInvoker(invoke_agent)
+        self.app = FastAPI(title="AgentRun Server", lifespan=self._lifespan)
+        invoker_config = config or ServerConfig()
+        # 按 thread_pool_size 创建的线程池归服务器所有，在 shutdown 时关闭
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if invoker_config.thread_pool_size:
+            self._executor = ThreadPoolExecutor(
+                max_workers=invoker_config.thread_pool_size,
+                thread_name_prefix="agent-invoke",
+            )
+        self.agent_invoker = AgentInvoker(
+            invoke_agent,
+            sync_batch_size=invoker_config.sync_batch_size,
+            executor=self._executor,
+            inline_sync=invoker_config.inline_sync,
+            stream_buffer_size=invoker_config.stream_buffer_size,
+        )
 
         # 配置 CORS
         self._setup_cors(config.cors_origins if config else None)
@@ -124,6 +145,25 @@ class AgentRunServer:
         # 挂载所有协议的 Router
         self._mount_protocols(protocols)
 
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        """应用生命周期：应用停止时释放服务器持有的资源"""
+        try:
+            yield
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """释放服务器持有的资源
+
+        关闭按 thread_pool_size 创建的线程池。通过 start() 运行或
+        应用生命周期事件正常执行时会自动调用；通过 app.mount 挂载为子应用时
+        子应用的生命周期事件不会执行，需要在主应用停止时手动调用。
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
     def _setup_cors(self, cors_origins: Optional[Sequence[str]] = None):
         """配置 CORS 中间件
 
@@ -133,8 +173,6 @@ class AgentRunServer:
         if not cors_origins:
             return
 
-        from fastapi.middleware.cors import CORSMiddleware
-
         origins = list(cors_origins) if cors_origins else ["*"]
 
         self.app.add_middleware(
@@ -146,7 +184,7 @@ class AgentRunServer:
             expose_headers=["*"],
         )
 
-        logger.debug(f"CORS 已启用，允许的源: {origins}")
+        logger.debug("CORS 已启用，允许的源: %s", origins)
 
     def _mount_protocols(self, protocols: List[ProtocolHandler]):
         """挂载所有协议的路由
@@ -165,8 +203,9 @@ class AgentRunServer:
             self.app.include_router(router, prefix=prefix)
 
             logger.debug(
-                f"已挂载协议: {protocol.__class__.__name__} ->"
-                f" {prefix or '(无前缀)'}"
+                "已挂载协议: %s -> %s",
+                type(protocol).__name__,
+                prefix or "(无前缀)",
             )
 
     def start(
@@ -204,5 +243,6 @@ class AgentRunServer:
             >>> app = FastAPI()
             >>> agent_server = AgentRunServer(invoke_agent=invoke_agent)
             >>> app.mount("/agent", agent_server.as_fastapi_app())
+            # 主应用停止时调用 agent_server.shutdown() 释放线程池
         """
         return self.app
@@ -25,11 +25,11 @@ class TestAguiEventNormalizer:
             event=EventType.TEXT,
             data={"delta": "Hello"},
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TEXT
-        assert results[0].data["delta"] == "Hello"
+        assert result is not None
+        assert result.event == EventType.TEXT
+        assert result.data["delta"] == "Hello"
 
     def test_pass_through_custom_events(self):
         """测试自定义事件直接传递"""
@@ -39,10 +39,10 @@ class TestAguiEventNormalizer:
             event=EventType.CUSTOM,
             data={"name": "step_started", "value": {"step": "test"}},
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.CUSTOM
+        assert result is not None
+        assert result.event == EventType.CUSTOM
 
     def test_tool_call_chunk_tracking(self):
         """测试 TOOL_CALL_CHUNK 状态追踪"""
@@ -53,12 +53,12 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "call_1", "name": "test", "args_delta": '{"x": 1}'},
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
         # 事件直接传递
-        assert len(results) == 1
-        assert results[0].event == EventType.TOOL_CALL_CHUNK
-        assert results[0].data["id"] == "call_1"
+        assert result is not None
+        assert result.event == EventType.TOOL_CALL_CHUNK
+        assert result.data["id"] == "call_1"
 
         # 状态被追踪
         assert "call_1" in normalizer.get_seen_tool_calls()
@@ -72,10 +72,10 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL,
             data={"id": "call_2", "name": "search", "args": '{"q": "hello"}'},
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TOOL_CALL
+        assert result is not None
+        assert result.event == EventType.TOOL_CALL
 
         # 状态被追踪
         assert "call_2" in normalizer.get_seen_tool_calls()
@@ -90,7 +90,7 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "call_1", "name": "test", "args_delta": "{}"},
         )
-        list(normalizer.normalize(chunk_event))
+        normalizer.normalize(chunk_event)
         assert "call_1" in normalizer.get_active_tool_calls()
 
         # 发送结果
@@ -98,10 +98,10 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_RESULT,
             data={"id": "call_1", "result": "success"},
         )
-        results = list(normalizer.normalize(result_event))
+        result = normalizer.normalize(result_event)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TOOL_RESULT
+        assert result is not None
+        assert result.event == EventType.TOOL_RESULT
 
         # 工具调用不再活跃（但仍在已见列表中）
         assert "call_1" not in normalizer.get_active_tool_calls()
@@ -121,7 +121,7 @@ class TestAguiEventNormalizer:
                     "args_delta": "{}",
                 },
             )
-            list(normalizer.normalize(event))
+            normalizer.normalize(event)
 
         # 两个都应该是活跃的
         assert len(normalizer.get_active_tool_calls()) == 2
@@ -133,7 +133,7 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_RESULT,
             data={"id": "call_a", "result": "done"},
         )
-        list(normalizer.normalize(result_event))
+        normalizer.normalize(result_event)
 
         # call_a 不再活跃，call_b 仍然活跃
         assert len(normalizer.get_active_tool_calls()) == 1
@@ -144,11 +144,11 @@ class TestAguiEventNormalizer:
         """测试字符串输入自动转换为文本事件"""
         normalizer = AguiEventNormalizer()
 
-        results = list(normalizer.normalize("Hello"))
+        result = normalizer.normalize("Hello")
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TEXT
-        assert results[0].data["delta"] == "Hello"
+        assert result is not None
+        assert result.event == EventType.TEXT
+        assert result.data["delta"] == "Hello"
 
     def test_dict_input_converted_to_agent_event(self):
         """测试字典输入自动转换为 AgentEvent"""
@@ -158,11 +158,11 @@ class TestAguiEventNormalizer:
             "event": EventType.TEXT,
             "data": {"delta": "Hello from dict"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TEXT
-        assert results[0].data["delta"] == "Hello from dict"
+        assert result is not None
+        assert result.event == EventType.TEXT
+        assert result.data["delta"] == "Hello from dict"
 
     def test_dict_with_string_event_type(self):
         """测试字符串事件类型的字典转换"""
@@ -172,10 +172,10 @@ class TestAguiEventNormalizer:
             "event": "CUSTOM",
             "data": {"name": "test"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.CUSTOM
+        assert result is not None
+        assert result.event == EventType.CUSTOM
 
     def test_invalid_dict_returns_nothing(self):
         """测试无效字典不产生事件"""
@@ -183,9 +183,33 @@ class TestAguiEventNormalizer:
 
         # 缺少 event 字段
         event_dict = {"data": {"delta": "Hello"}}
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
+
+        assert result is None
+
+    def test_normalize_returns_same_event_instance(self):
+        """测试 AgentEvent 输入原样返回（不产生生成器）"""
+        normalizer = AguiEventNormalizer()
+
+        event = AgentEvent(
+            event=EventType.TOOL_CALL,
+            data={"id": "call_1", "name": "test", "args": "{}"},
+        )
+
+        assert normalizer.normalize(event) is event
+        assert "call_1" in normalizer.get_active_tool_calls()
 
-        assert len(results) == 0
+    def test_normalize_iter_compat(self):
+        """测试 normalize_iter 兼容旧的迭代器接口"""
+        normalizer = AguiEventNormalizer()
+
+        results = list(normalizer.normalize_iter("Hello"))
+        assert len(results) == 1
+        assert results[0].event == EventType.TEXT
+        assert results[0].data["delta"] == "Hello"
+
+        # 无法解析的输入不产生事件
+        assert list(normalizer.normalize_iter({"data": {}})) == []
 
     def test_dict_with_invalid_event_type_value(self):
         """测试字典中无效的事件类型值"""
@@ -196,10 +220,10 @@ class TestAguiEventNormalizer:
             "event": "INVALID_EVENT_TYPE",
             "data": {"delta": "Hello"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
         # 无效事件类型应该返回空
-        assert len(results) == 0
+        assert result is None
 
     def test_dict_with_invalid_event_type_key(self):
         """测试字典中无效的事件类型键（尝试通过枚举名称）"""
@@ -210,26 +234,33 @@ class TestAguiEventNormalizer:
             "event": "NONEXISTENT",
             "data": {"delta": "Hello"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
         # 无效事件类型应该返回空
-        assert len(results) == 0
+        assert result is None
+
+    def test_dict_with_non_string_event_type(self):
+        """测试字典中非字符串的事件类型"""
+        normalizer = AguiEventNormalizer()
+
+        assert normalizer.normalize({"event": 123, "data": {}}) is None
+        assert normalizer.normalize({"event": ["TEXT"], "data": {}}) is None
 
     def test_normalize_with_non_standard_input(self):
         """测试非标准输入类型"""
         normalizer = AguiEventNormalizer()
 
         # 传入整数
-        results = list(normalizer.normalize(123))
-        assert len(results) == 0
+        result = normalizer.normalize(123)
+        assert result is None
 
         # 传入 None
-        results = list(normalizer.normalize(None))
-        assert len(results) == 0
+        result = normalizer.normalize(None)
+        assert result is None
 
         # 传入列表
-        results = list(normalizer.normalize([1, 2, 3]))
-        assert len(results) == 0
+        result = normalizer.normalize([1, 2, 3])
+        assert result is None
 
     def test_reset_clears_state(self):
         """测试 reset 清空状态"""
@@ -240,7 +271,7 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "call_1", "name": "test", "args_delta": "{}"},
         )
-        list(normalizer.normalize(event))
+        normalizer.normalize(event)
         assert len(normalizer.get_active_tool_calls()) == 1
         assert len(normalizer.get_seen_tool_calls()) == 1
 
@@ -259,9 +290,9 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL,
             data={"id": "", "name": "test", "args": "{}"},  # 空 id
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
+        assert result is not None
         # 空 id 不会被添加到追踪列表
         assert len(normalizer.get_seen_tool_calls()) == 0
         assert len(normalizer.get_active_tool_calls()) == 0
@@ -274,9 +305,9 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "", "name": "test", "args_delta": "{}"},  # 空 id
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
+        assert result is not None
         # 空 id 不会被添加到追踪列表
         assert len(normalizer.get_seen_tool_calls()) == 0
 
@@ -288,14 +319,52 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "call_1", "args_delta": "{}"},  # 没有 name
         )
-        results = list(normalizer.normalize(event))
+        result = normalizer.normalize(event)
 
-        assert len(results) == 1
+        assert result is not None
         # id 会被追踪，但没有 name
         assert "call_1" in normalizer.get_seen_tool_calls()
         # 没有 name 时不会添加到 active_tool_calls 的名称映射
         assert "call_1" not in normalizer.get_active_tool_calls()
 
+    def test_seen_tool_calls_not_duplicated(self):
+        """测试同一工具调用在不同状态间切换时只出现一次"""
+        normalizer = AguiEventNormalizer()
+
+        # 先发送无名称的 chunk，再发送带名称的 chunk，最后发送结果
+        normalizer.normalize(
+            AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "call_1", "args_delta": "{"},
+            )
+        )
+        normalizer.normalize(
+            AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "call_1", "name": "test", "args_delta": "}"},
+            )
+        )
+        assert normalizer.get_seen_tool_calls() == ("call_1",)
+        assert normalizer.get_active_tool_calls() == ("call_1",)
+
+        normalizer.normalize(
+            AgentEvent(
+                event=EventType.TOOL_RESULT,
+                data={"id": "call_1", "result": "done"},
+            )
+        )
+        assert normalizer.get_seen_tool_calls() == ("call_1",)
+        assert normalizer.get_active_tool_calls() == ()
+
+        # 未见过的工具调用结果不会被记录
+        normalizer.normalize(
+            AgentEvent(
+                event=EventType.TOOL_RESULT,
+                data={"id": "call_unknown", "result": "done"},
+            )
+        )
+        assert normalizer.get_seen_tool_calls() == ("call_1",)
+
     def test_tool_result_with_empty_id(self):
         """测试空 tool_call_id 的 TOOL_RESULT 事件"""
         normalizer = AguiEventNormalizer()
@@ -305,7 +374,7 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_CALL_CHUNK,
             data={"id": "call_1", "name": "test", "args_delta": "{}"},
         )
-        list(normalizer.normalize(chunk_event))
+        normalizer.normalize(chunk_event)
         assert "call_1" in normalizer.get_active_tool_calls()
 
         # 发送空 id 的结果
@@ -313,9 +382,9 @@ class TestAguiEventNormalizer:
             event=EventType.TOOL_RESULT,
             data={"id": "", "result": "done"},  # 空 id
         )
-        results = list(normalizer.normalize(result_event))
+        result = normalizer.normalize(result_event)
 
-        assert len(results) == 1
+        assert result is not None
         # call_1 仍然是活跃的（因为结果的 id 为空）
         assert "call_1" in normalizer.get_active_tool_calls()
 
@@ -327,11 +396,11 @@ class TestAguiEventNormalizer:
             "event": EventType.TEXT,  # 直接使用枚举，不是字符串
             "data": {"delta": "Hello"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TEXT
-        assert results[0].data["delta"] == "Hello"
+        assert result is not None
+        assert result.event == EventType.TEXT
+        assert result.data["delta"] == "Hello"
 
     def test_dict_with_event_type_enum_custom(self):
         """测试字典中直接使用 EventType.CUSTOM 枚举"""
@@ -341,11 +410,11 @@ class TestAguiEventNormalizer:
             "event": EventType.CUSTOM,  # 直接使用枚举
             "data": {"name": "test_event", "value": {"key": "value"}},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.CUSTOM
-        assert results[0].data["name"] == "test_event"
+        assert result is not None
+        assert result.event == EventType.CUSTOM
+        assert result.data["name"] == "test_event"
 
     def test_dict_with_event_type_enum_tool_call(self):
         """测试字典中直接使用 EventType.TOOL_CALL 枚举"""
@@ -355,10 +424,10 @@ class TestAguiEventNormalizer:
             "event": EventType.TOOL_CALL,  # 直接使用枚举
             "data": {"id": "tc-1", "name": "test", "args": "{}"},
         }
-        results = list(normalizer.normalize(event_dict))
+        result = normalizer.normalize(event_dict)
 
-        assert len(results) == 1
-        assert results[0].event == EventType.TOOL_CALL
+        assert result is not None
+        assert result.event == EventType.TOOL_CALL
 
     def test_complete_tool_call_sequence(self):
         """测试完整的工具调用序列追踪"""
@@ -386,7 +455,7 @@ class TestAguiEventNormalizer:
         ]
 
         for event in events:
-            all_results.extend(normalizer.normalize(event))
+            all_results.extend(normalizer.normalize_iter(event))
 
         # 事件保持原样传递
         assert len(all_results) == 3
@@ -401,6 +470,56 @@ class TestAguiEventNormalizer:
         assert "call_1" not in normalizer.get_active_tool_calls()
         assert "call_1" in normalizer.get_seen_tool_calls()
 
+    def test_normalize_batch(self):
+        """测试批量规范化与逐个规范化结果一致"""
+        normalizer = AguiEventNormalizer()
+
+        events = [
+            "Hello",
+            {"data": {"delta": "ignored"}},  # 无效输入被跳过
+            {"event": "TOOL_CALL", "data": {"id": "call_1", "name": "a"}},
+            AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "call_2", "name": "b", "args_delta": "{}"},
+            ),
+            AgentEvent(
+                event=EventType.TOOL_RESULT,
+                data={"id": "call_1", "result": "done"},
+            ),
+        ]
+
+        results = normalizer.normalize_batch(events)
+
+        assert [e.event for e in results] == [
+            EventType.TEXT,
+            EventType.TOOL_CALL,
+            EventType.TOOL_CALL_CHUNK,
+            EventType.TOOL_RESULT,
+        ]
+        assert normalizer.get_active_tool_calls() == ("call_2",)
+        assert sorted(normalizer.get_seen_tool_calls()) == ["call_1", "call_2"]
+
+    def test_trust_input(self):
+        """测试 trust_input 模式直接使用 AgentEvent 并追踪工具调用"""
+        normalizer = AguiEventNormalizer(trust_input=True)
+
+        event = AgentEvent(
+            event=EventType.TOOL_CALL,
+            data={"id": "call_1", "name": "test", "args": "{}"},
+        )
+        assert normalizer.normalize(event) is event
+        assert normalizer.get_active_tool_calls() == ("call_1",)
+
+        results = normalizer.normalize_batch([
+            AgentEvent(
+                event=EventType.TOOL_RESULT,
+                data={"id": "call_1", "result": "done"},
+            ),
+        ])
+        assert len(results) == 1
+        assert normalizer.get_active_tool_calls() == ()
+        assert normalizer.get_seen_tool_calls() == ("call_1",)
+
 
 class TestAguiEventNormalizerWithAguiProtocol:
     """使用 ag-ui-protocol 验证事件结构的测试"""
@@ -434,7 +553,7 @@ class TestAguiEventNormalizerWithAguiProtocol:
 
         all_results = []
         for event in events:
-            all_results.extend(normalizer.normalize(event))
+            all_results.extend(normalizer.normalize_iter(event))
 
         # 验证 TOOL_CALL_CHUNK 可以映射到 ag-ui
         chunk_result = all_results[0]
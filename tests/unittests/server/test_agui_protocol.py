@@ -35,6 +35,20 @@ class TestAGUIProtocolHandler:
         handler = AGUIProtocolHandler(config)
         assert handler.get_prefix() == "/custom/agui"
 
+    def test_uuid4_str_format(self):
+        """测试生成的 ID 是合法的 UUID v4 字符串"""
+        import uuid
+
+        from agentrun.server.agui_protocol import _uuid4_str
+
+        ids = {_uuid4_str() for _ in range(100)}
+        assert len(ids) == 100
+        for value in ids:
+            parsed = uuid.UUID(value)
+            assert str(parsed) == value
+            assert parsed.version == 4
+            assert parsed.variant == uuid.RFC_4122
+
 
 class TestAGUIProtocolEndpoints:
     """测试 AG-UI 协议端点"""
@@ -449,6 +463,44 @@ class TestAGUIProtocolEndpoints:
                     assert data["delta"] == "overwritten"
                     break
 
+    @pytest.mark.asyncio
+    async def test_addition_with_non_str_keys(self):
+        """测试 addition 及 HITL 参数中的非 str 键与 json.dumps 一样转为字符串"""
+
+        async def invoke_agent(request: AgentRequest):
+            yield AgentEvent(
+                event=EventType.TEXT,
+                data={"delta": "Hello"},
+                addition={"meta": {1: "x"}},
+            )
+            yield AgentEvent(
+                event=EventType.HITL,
+                data={
+                    "id": "hitl-1",
+                    "prompt": "Pick one",
+                    "schema": {"choices": {1: "a"}},
+                },
+            )
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/ag-ui/agent",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+        )
+
+        assert response.status_code == 200
+        events = [
+            json.loads(line[6:])
+            async for line in response.aiter_lines()
+            if line.startswith("data: ")
+        ]
+        by_type = {event["type"]: event for event in events}
+
+        assert by_type["TEXT_MESSAGE_CONTENT"]["meta"] == {"1": "x"}
+        args = json.loads(by_type["TOOL_CALL_ARGS"]["delta"])
+        assert args["schema"] == {"choices": {"1": "a"}}
+        assert events[-1]["type"] == "RUN_FINISHED"
+
     @pytest.mark.asyncio
     async def test_addition_protocol_only_mode(self):
         """测试 addition PROTOCOL_ONLY 模式"""
@@ -521,7 +573,9 @@ class TestAGUIProtocolEndpoints:
 
         assert response.status_code == 200
         content = response.text
-        assert '{"custom": "data"}' in content
+        # 补齐为恰好一个空行
+        assert '{"custom": "data"}\n\n' in content
+        assert '{"custom": "data"}\n\n\n' not in content
 
     @pytest.mark.asyncio
     async def test_raw_event_already_has_double_newline(self):
@@ -705,6 +759,322 @@ class TestAGUIProtocolErrorStream:
                     break
 
 
+class TestAGUIProtocolEncoder:
+    """测试 orjson 编码器与 ag-ui EventEncoder 输出一致"""
+
+    def test_encode_matches_event_encoder(self):
+        from ag_ui.core import (
+            CustomEvent,
+            RunErrorEvent,
+            RunStartedEvent,
+            StateSnapshotEvent,
+            TextMessageContentEvent,
+        )
+        from ag_ui.encoder import EventEncoder
+
+        from agentrun.server.agui_protocol import _ENCODER
+
+        events = [
+            RunStartedEvent(thread_id="thread-1", run_id="run-1"),
+            TextMessageContentEvent(message_id="msg-1", delta='你好 "\n'),
+            RunErrorEvent(message="oops"),
+            StateSnapshotEvent(snapshot={"a": 1.5, "b": [1, None]}),
+            CustomEvent(name="custom", value=None),
+        ]
+        reference = EventEncoder()
+        for event in events:
+            assert _ENCODER.encode(event) == reference.encode(event)
+            assert _ENCODER.encode_bytes(event) == reference.encode(
+                event
+            ).encode("utf-8")
+
+    def test_unset_optional_fields_match_event_encoder(self):
+        """测试未赋值的可选字段与 EventEncoder 一样被省略，逐字节一致"""
+        from ag_ui.core import (
+            RunFinishedEvent,
+            StepStartedEvent,
+            TextMessageContentEvent,
+            TextMessageEndEvent,
+            TextMessageStartEvent,
+            ToolCallEndEvent,
+            ToolCallStartEvent,
+        )
+        from ag_ui.encoder import EventEncoder
+
+        from agentrun.server.agui_protocol import _ENCODER
+
+        events = [
+            TextMessageStartEvent(message_id="m", role="assistant"),
+            TextMessageContentEvent(message_id="m", delta="hi"),
+            TextMessageEndEvent(message_id="m"),
+            ToolCallStartEvent(tool_call_id="t", tool_call_name="f"),
+            ToolCallEndEvent(tool_call_id="t"),
+            RunFinishedEvent(thread_id="thread-1", run_id="run-1"),
+            StepStartedEvent(step_name="step"),
+        ]
+        reference = EventEncoder()
+        for event in events:
+            encoded = _ENCODER.encode_bytes(event)
+            assert encoded == reference.encode(event).encode("utf-8")
+            assert b"null" not in encoded
+
+        assert _ENCODER.encode_bytes(
+            TextMessageContentEvent(message_id="m", delta="hi")
+        ) == (
+            b'data: {"type":"TEXT_MESSAGE_CONTENT","messageId":"m",'
+            b'"delta":"hi"}\n\n'
+        )
+
+    def test_boundary_templates_match_event_encoder(self):
+        from ag_ui.core import (
+            RunFinishedEvent,
+            RunStartedEvent,
+            TextMessageEndEvent,
+            TextMessageStartEvent,
+        )
+        from ag_ui.encoder import EventEncoder
+
+        from agentrun.server.agui_protocol import (
+            _encode_run_finished,
+            _encode_run_started,
+            StreamStateMachine,
+        )
+
+        def encode(event):
+            return EventEncoder().encode(event).encode("utf-8")
+
+        # ID 中包含需要转义的字符
+        thread_id = 'thread "1"\n{x} 100%'
+        run_id = "运行-1"
+
+        assert _encode_run_started(thread_id, run_id) == encode(
+            RunStartedEvent(thread_id=thread_id, run_id=run_id)
+        )
+        assert _encode_run_finished(thread_id, run_id) == encode(
+            RunFinishedEvent(thread_id=thread_id, run_id=run_id)
+        )
+
+        state = StreamStateMachine()
+        message_id = state.text.message_id
+        assert state.ensure_text_started() == encode(
+            TextMessageStartEvent(message_id=message_id, role="assistant")
+        )
+        # 已开始的文本消息不会重复发送 START
+        assert state.ensure_text_started() is None
+        assert state.end_text_if_open() == encode(
+            TextMessageEndEvent(message_id=message_id)
+        )
+        assert state.end_text_if_open() is None
+
+        # 结束后再次开始时使用新的 message_id
+        text = state.text
+        assert state.ensure_text_started() is not None
+        assert state.text is text
+        assert state.text.message_id != message_id
+        assert state.end_text_if_open() == encode(
+            TextMessageEndEvent(message_id=state.text.message_id)
+        )
+
+    def test_streaming_templates_match_event_encoder(self):
+        from ag_ui.core import (
+            TextMessageContentEvent,
+            ToolCallArgsEvent,
+            ToolCallEndEvent,
+            ToolCallStartEvent,
+        )
+        from ag_ui.encoder import EventEncoder
+
+        from agentrun.server.agui_protocol import (
+            _encode_text_content,
+            _encode_tool_call_args,
+            _encode_tool_call_end,
+            _encode_tool_call_start,
+        )
+
+        def encode(event):
+            return EventEncoder().encode(event).encode("utf-8")
+
+        tool_id = 'call "1"\n100%'
+        for delta in ["", "你好", '{"a": "%s"}\n', "__delta__"]:
+            # ag-ui-protocol 0.1.x 不允许空的文本 delta
+            if delta:
+                assert _encode_text_content("msg-1", delta) == encode(
+                    TextMessageContentEvent(message_id="msg-1", delta=delta)
+                )
+            assert _encode_tool_call_args(tool_id, delta) == encode(
+                ToolCallArgsEvent(tool_call_id=tool_id, delta=delta)
+            )
+        assert _encode_tool_call_start(tool_id, "天气") == encode(
+            ToolCallStartEvent(tool_call_id=tool_id, tool_call_name="天气")
+        )
+        assert _encode_tool_call_end(tool_id) == encode(
+            ToolCallEndEvent(tool_call_id=tool_id)
+        )
+
+    def test_state_snapshot_matches_event_encoder(self):
+        import datetime
+        import uuid
+
+        from ag_ui.core import StateSnapshotEvent
+        from ag_ui.encoder import EventEncoder
+
+        from agentrun.server.agui_protocol import _encode_state_snapshot
+
+        snapshots = [
+            {},
+            {"a": [1, 2.5, None], "b": {"c": "100% 完成"}, "t": (1, 2)},
+            # 以下包含非 JSON 原生类型，回退到模型编码
+            {"d": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)},
+            {1: "int key", "s": {1, 2}},
+            {"u": uuid.UUID(int=1)},
+            None,
+            [1, 2],
+        ]
+        for snapshot in snapshots:
+            assert _encode_state_snapshot(snapshot) == EventEncoder().encode(
+                StateSnapshotEvent(snapshot=snapshot)
+            ).encode("utf-8")
+
+
+class TestAGUIProtocolBatchFrames:
+    """测试 SSE 帧合并"""
+
+    @staticmethod
+    async def collect(frames, max_bytes, max_wait):
+        from agentrun.server.agui_protocol import _batch_frames
+
+        return [
+            chunk async for chunk in _batch_frames(frames, max_bytes, max_wait)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_coalesces_until_max_bytes(self):
+        """测试缓冲达到阈值时写出"""
+
+        async def frames():
+            for _ in range(5):
+                yield b"aaaa"
+
+        chunks = await self.collect(frames(), 8, 10.0)
+        assert chunks == [b"aaaaaaaa", b"aaaaaaaa", b"aaaa"]
+
+    @pytest.mark.asyncio
+    async def test_flushes_after_max_wait(self):
+        """测试上游空闲时按最长等待时间写出"""
+        import asyncio
+
+        async def frames():
+            yield b"x"
+            await asyncio.sleep(0.1)
+            yield b"y"
+
+        chunks = await self.collect(frames(), 1024, 0.01)
+        assert chunks == [b"x", b"y"]
+
+    @pytest.mark.asyncio
+    async def test_run_error_frame_flushes_immediately(self):
+        """测试 RUN_ERROR 帧立即写出"""
+        import asyncio
+
+        error_frame = b'data: {"type":"RUN_ERROR","message":"oops"}\n\n'
+
+        async def frames():
+            yield b"x"
+            yield error_frame
+            await asyncio.sleep(0.1)
+            yield b"y"
+
+        chunks = await self.collect(frames(), 1024, 10.0)
+        assert chunks == [b"x" + error_frame, b"y"]
+
+    @pytest.mark.asyncio
+    async def test_flushes_buffer_before_source_error(self):
+        """测试上游抛出异常时先写出已缓冲的帧"""
+        from agentrun.server.agui_protocol import _batch_frames
+
+        async def frames():
+            yield b"early"
+            yield b"late"
+            raise RuntimeError("boom")
+
+        chunks = []
+        with pytest.raises(RuntimeError, match="boom"):
+            async for chunk in _batch_frames(frames(), 1024, 10.0):
+                chunks.append(chunk)
+
+        assert chunks == [b"earlylate"]
+
+    @pytest.mark.asyncio
+    async def test_source_keeps_contextvars_between_steps(self):
+        """测试上游各步骤在同一上下文中执行，设置的 ContextVar 不丢失"""
+        import contextvars
+
+        var: contextvars.ContextVar[str] = contextvars.ContextVar(
+            "batch_test_var", default="unset"
+        )
+
+        async def frames():
+            yield b"a"
+            var.set("set-in-gen")
+            yield var.get().encode()
+            yield var.get().encode()
+
+        chunks = await self.collect(frames(), 1024, 10.0)
+        assert b"".join(chunks) == b"aset-in-genset-in-gen"
+
+    @pytest.mark.asyncio
+    async def test_closes_source_on_early_exit(self):
+        """测试消费方提前结束时上游的 finally 立即执行"""
+        from agentrun.server.agui_protocol import _batch_frames
+
+        closed = []
+
+        async def frames():
+            try:
+                while True:
+                    yield b"x" * 8
+            finally:
+                closed.append(True)
+
+        batched = _batch_frames(frames(), 8, 10.0)
+        assert await batched.__anext__() == b"x" * 8
+        await batched.aclose()
+
+        assert closed == [True]
+
+    @pytest.mark.asyncio
+    async def test_endpoint_with_batching(self):
+        """测试开启合并后端点输出的事件完整且有序"""
+        from agentrun.server.model import AGUIProtocolConfig
+
+        async def invoke_agent(request: AgentRequest):
+            yield "Hello"
+            yield " World"
+
+        config = ServerConfig(agui=AGUIProtocolConfig(batch_bytes=4096))
+        server = AgentRunServer(invoke_agent=invoke_agent, config=config)
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/ag-ui/agent",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+        )
+
+        assert response.status_code == 200
+        types = [
+            json.loads(line[6:])["type"]
+            for line in response.text.splitlines()
+            if line.startswith("data: ")
+        ]
+        assert types == [
+            "RUN_STARTED",
+            "TEXT_MESSAGE_START",
+            "TEXT_MESSAGE_CONTENT",
+            "TEXT_MESSAGE_CONTENT",
+            "TEXT_MESSAGE_END",
+            "RUN_FINISHED",
+        ]
+
+
 class TestAGUIProtocolApplyAddition:
     """测试 _apply_addition 方法"""
 
@@ -759,6 +1129,24 @@ class TestAGUIProtocolApplyAddition:
         # type 保持不变
         assert result["type"] == "TEXT_MESSAGE_CONTENT"
 
+    def test_apply_addition_disjoint_keys(self):
+        """无重复字段时浅合并结果与深度合并一致"""
+        from agentrun.utils.helper import merge
+
+        handler = AGUIProtocolHandler()
+
+        event_data = {"delta": "Hello", "type": "TEXT_MESSAGE_CONTENT"}
+        addition = {"meta": {"a": [1]}, "extra": None}
+
+        result = handler._apply_addition(event_data, addition)
+
+        assert result == merge(event_data, addition)
+        assert result is not event_data
+        # no_new_field 时仍忽略新字段
+        assert handler._apply_addition(
+            event_data, addition, {"no_new_field": True}
+        ) == {"delta": "Hello", "type": "TEXT_MESSAGE_CONTENT"}
+
 
 class TestAGUIProtocolConvertMessages:
     """测试消息转换功能"""
@@ -1033,7 +1421,7 @@ class TestAGUIProtocolUnknownEventType:
         assert len(results) == 2
         # 解析第一个 SSE 数据 (TOOL_CALL_START)
         sse_data_1 = results[0]
-        assert sse_data_1.startswith("data: ")
+        assert sse_data_1.startswith(b"data: ")
         data_1 = json.loads(sse_data_1[6:].strip())
         assert data_1["type"] == "TOOL_CALL_START"
         assert data_1["toolCallId"] == "tc-1"
@@ -1041,7 +1429,7 @@ class TestAGUIProtocolUnknownEventType:
 
         # 解析第二个 SSE 数据 (TOOL_CALL_ARGS)
         sse_data_2 = results[1]
-        assert sse_data_2.startswith("data: ")
+        assert sse_data_2.startswith(b"data: ")
         data_2 = json.loads(sse_data_2[6:].strip())
         assert data_2["type"] == "TOOL_CALL_ARGS"
         assert data_2["toolCallId"] == "tc-1"
@@ -1126,6 +1514,41 @@ class TestAGUIProtocolToolCallBranches:
         )
         assert result_count == 2
 
+    @pytest.mark.asyncio
+    async def test_tool_result_chunks_prepended_to_result(self):
+        """测试 TOOL_RESULT_CHUNK 缓存的分片拼接在最终结果之前"""
+
+        async def invoke_agent(request: AgentRequest):
+            yield AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "name": "tool", "args_delta": "{}"},
+            )
+            for delta in ["进度 1/2;", "进度 2/2;"]:
+                yield AgentEvent(
+                    event=EventType.TOOL_RESULT_CHUNK,
+                    data={"id": "tc-1", "delta": delta},
+                )
+            yield AgentEvent(
+                event=EventType.TOOL_RESULT,
+                data={"id": "tc-1", "result": "完成"},
+            )
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/ag-ui/agent",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+        )
+
+        assert response.status_code == 200
+        lines = [line async for line in response.aiter_lines() if line]
+        results = [
+            json.loads(line[6:])
+            for line in lines
+            if line.startswith("data: ") and "TOOL_CALL_RESULT" in line
+        ]
+        assert len(results) == 1
+        assert results[0]["content"] == "进度 1/2;进度 2/2;完成"
+
     @pytest.mark.asyncio
     async def test_empty_sse_data_filtered(self):
         """测试空 SSE 数据被过滤"""
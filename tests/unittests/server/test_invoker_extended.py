@@ -3,11 +3,18 @@
 测试 AgentInvoker 的更多边界情况。
 """
 
+import gc
 from typing import List
 
 import pytest
 
-from agentrun.server.invoker import AgentInvoker
+from agentrun.server import invoker as invoker_module
+from agentrun.server.invoker import (
+    _ITER_KIND_CACHE,
+    _iter_kind,
+    _SYNC_ITERATOR,
+    AgentInvoker,
+)
 from agentrun.server.model import AgentEvent, AgentRequest, EventType
 
 
@@ -235,6 +242,77 @@ class TestInvokerIterateAsync:
         assert items[0].data["delta"] == "Hello"
         assert items[1].data["delta"] == "World"
 
+    @pytest.mark.asyncio
+    async def test_iterate_sync_generator_in_batches(self, req):
+        """测试按批读取同步生成器，异常前已读取的元素仍会输出"""
+
+        def invoke_agent(req: AgentRequest):
+            for i in range(5):
+                yield str(i)
+            raise RuntimeError("boom")
+
+        invoker = AgentInvoker(invoke_agent, sync_batch_size=3)
+
+        items: List[AgentEvent] = []
+        async for item in invoker.invoke_stream(req):
+            items.append(item)
+
+        assert [item.data.get("delta") for item in items[:-1]] == [
+            "0",
+            "1",
+            "2",
+            "3",
+            "4",
+        ]
+        assert items[-1].event == EventType.ERROR
+        assert items[-1].data["message"] == "boom"
+
+    @pytest.mark.asyncio
+    async def test_iterate_sync_generator_with_executor(self, req):
+        """测试同步 handler 及同步生成器在指定的线程池中执行"""
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+
+        def invoke_agent(req: AgentRequest):
+            yield threading.current_thread().name
+            yield threading.current_thread().name
+
+        with ThreadPoolExecutor(thread_name_prefix="custom-pool") as executor:
+            invoker = AgentInvoker(invoke_agent, executor=executor)
+
+            items: List[AgentEvent] = []
+            async for item in invoker.invoke_stream(req):
+                items.append(item)
+
+        assert len(items) == 2
+        assert all(
+            item.data["delta"].startswith("custom-pool") for item in items
+        )
+
+    @pytest.mark.asyncio
+    async def test_iterate_sync_generator_inline(self, req):
+        """测试 inline_sync 时同步 handler 及同步生成器在当前线程中执行"""
+        import threading
+
+        def invoke_agent(req: AgentRequest):
+            yield str(threading.get_ident())
+            yield str(threading.get_ident())
+
+        invoker = AgentInvoker(invoke_agent, inline_sync=True)
+
+        items: List[AgentEvent] = []
+        async for item in invoker.invoke_stream(req):
+            items.append(item)
+
+        assert [item.data["delta"] for item in items] == [
+            str(threading.get_ident())
+        ] * 2
+
+        result = await invoker.invoke_non_stream(req)
+        assert [r.data["delta"] for r in result] == [
+            str(threading.get_ident())
+        ] * 2
+
     @pytest.mark.asyncio
     async def test_iterate_async_generator(self, req):
         """测试迭代异步生成器"""
@@ -330,6 +408,63 @@ class TestInvokerIsIterator:
 
         assert invoker._is_iterator(async_gen()) is True
 
+    def test_iter_kind_cache_releases_dynamic_types(self):
+        """测试迭代类型缓存不会持有动态创建的类型"""
+
+        def make_iterable():
+            cls = type(
+                "DynamicIterable", (), {"__iter__": lambda self: iter(())}
+            )
+            return cls()
+
+        obj = make_iterable()
+        obj_type = type(obj)
+        assert _iter_kind(obj) == _SYNC_ITERATOR
+        assert obj_type in _ITER_KIND_CACHE
+
+        size = len(_ITER_KIND_CACHE)
+        del obj, obj_type
+        gc.collect()
+
+        assert len(_ITER_KIND_CACHE) == size - 1
+
+
+class TestInvokerThreadPoolEnv:
+    """测试 AGENTRUN_THREAD_POOL_SIZE 环境变量"""
+
+    @pytest.fixture(autouse=True)
+    def reset_shared_executor(self, monkeypatch):
+        monkeypatch.setattr(invoker_module, "_shared_executor", None)
+
+    def test_valid_size_creates_shared_executor(self, monkeypatch):
+        """测试合法取值创建共享线程池"""
+        monkeypatch.setenv(invoker_module.THREAD_POOL_SIZE_ENV, "3")
+
+        executor = invoker_module._get_default_executor()
+
+        assert executor is not None
+        assert executor._max_workers == 3
+        assert invoker_module._get_default_executor() is executor
+        executor.shutdown(wait=False)
+
+    @pytest.mark.parametrize("value", ["abc", "0", "-2", "1.5", "  "])
+    def test_invalid_size_falls_back_with_warning(self, monkeypatch, value):
+        """测试非法取值记录警告并回退到事件循环默认线程池"""
+        monkeypatch.setenv(invoker_module.THREAD_POOL_SIZE_ENV, value)
+        warnings: List[tuple] = []
+        monkeypatch.setattr(
+            invoker_module.logger,
+            "warning",
+            lambda *args, **kwargs: warnings.append(args),
+        )
+
+        assert invoker_module._get_default_executor() is None
+        assert AgentInvoker(lambda req: "Hello")._executor is None
+        if value.strip():
+            assert warnings
+        else:
+            assert not warnings
+
 
 class TestInvokerProcessUserEvent:
     """测试 _process_user_event 方法"""
@@ -362,10 +497,18 @@ class TestInvokerProcessUserEvent:
 
         assert len(items) == 1
         assert items[0].event == EventType.TOOL_CALL_CHUNK
-        # id 应该被自动生成（UUID）
+        # id 应该被自动生成
         assert items[0].data["id"] is not None
         assert len(items[0].data["id"]) > 0
 
+    def test_generated_tool_call_ids_are_unique(self):
+        """测试自动生成的工具调用 ID 互不相同"""
+        from agentrun.server.invoker import _next_tool_call_id
+
+        ids = {_next_tool_call_id() for _ in range(1000)}
+        assert len(ids) == 1000
+        assert all(tool_id.startswith("tc-") for tool_id in ids)
+
     @pytest.mark.asyncio
     async def test_other_events_passthrough(self, req):
         """测试其他事件直接传递"""
@@ -700,9 +843,9 @@ class TestInvokerAsyncNonIterator:
     async def test_handler_detected_as_async_but_returns_non_awaitable(
         self, req
     ):
-        """测试被检测为异步但返回非 awaitable 值的处理器（覆盖 196 行）
+        """测试修改 is_async 不影响 invoke 的调用方式
 
-        通过 mock is_async 属性来模拟这种边界情况
+        invoke 的调用方式在初始化时根据 handler 类型确定
         """
         from unittest.mock import patch
 
@@ -711,12 +854,206 @@ class TestInvokerAsyncNonIterator:
 
         invoker = AgentInvoker(sync_handler)
 
-        # 强制设置 is_async 为 True，模拟边界情况
+        # 强制设置 is_async 为 True，同步 handler 仍在线程池中调用
         with patch.object(invoker, "is_async", True):
-            # 由于 sync_handler 返回的是字符串（不是 awaitable），
-            # 代码会走到第 196 行的 else 分支
             result = await invoker.invoke(req)
 
         assert isinstance(result, list)
         assert len(result) == 1
         assert result[0].data["delta"] == "Hello"
+
+
+class TestInvokerNonStream:
+    """测试 invoke_non_stream 和 invoke_sync 方法"""
+
+    @pytest.fixture
+    def req(self):
+        return AgentRequest(
+            messages=[],
+            tools=[],
+            stream=False,
+            raw_request=None,
+            protocol="unknown",
+        )
+
+    @pytest.mark.asyncio
+    async def test_sync_generator_collected_in_one_thread(self, req):
+        """测试同步生成器在同一个线程中被完整读取"""
+        import threading
+
+        def invoke_agent(req: AgentRequest):
+            yield str(threading.get_ident())
+            yield AgentEvent(
+                event=EventType.TOOL_CALL,
+                data={"id": "tc-1", "name": "test", "args": "{}"},
+            )
+            yield ""
+            yield str(threading.get_ident())
+
+        invoker = AgentInvoker(invoke_agent)
+        result = await invoker.invoke_non_stream(req)
+
+        # 空字符串被忽略，TOOL_CALL 被展开
+        assert len(result) == 3
+        assert result[1].event == EventType.TOOL_CALL_CHUNK
+        assert result[0].data["delta"] == result[2].data["delta"]
+        assert result[0].data["delta"] != str(threading.get_ident())
+
+    @pytest.mark.asyncio
+    async def test_async_generator_collected(self, req):
+        """测试异步生成器的结果被收集为列表"""
+
+        async def invoke_agent(req: AgentRequest):
+            yield "Hello"
+            yield "World"
+
+        invoker = AgentInvoker(invoke_agent)
+        result = await invoker.invoke_non_stream(req)
+
+        assert [r.data["delta"] for r in result] == ["Hello", "World"]
+
+    def test_invoke_sync_rejects_async_handler(self, req):
+        """测试 invoke_sync 不支持异步 handler"""
+
+        async def invoke_agent(req: AgentRequest):
+            return "Hello"
+
+        invoker = AgentInvoker(invoke_agent)
+        with pytest.raises(TypeError):
+            invoker.invoke_sync(req)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("inline_sync", [False, True])
+    async def test_sync_handler_returning_async_generator(
+        self, req, inline_sync
+    ):
+        """测试同步 handler 返回异步生成器时结果不丢失"""
+
+        async def generate():
+            yield "hello"
+            yield " world"
+
+        def invoke_agent(req: AgentRequest):
+            return generate()
+
+        invoker = AgentInvoker(invoke_agent, inline_sync=inline_sync)
+        result = await invoker.invoke_non_stream(req)
+
+        assert [r.data["delta"] for r in result] == ["hello", " world"]
+
+    def test_invoke_sync_rejects_async_generator_result(self, req):
+        """测试 invoke_sync 不支持返回异步生成器的同步 handler"""
+
+        async def generate():
+            yield "hello"
+
+        def invoke_agent(req: AgentRequest):
+            return generate()
+
+        invoker = AgentInvoker(invoke_agent)
+        with pytest.raises(TypeError):
+            invoker.invoke_sync(req)
+
+
+class TestInvokerStreamBuffer:
+    """测试 stream_buffer_size 缓冲"""
+
+    @pytest.fixture
+    def req(self):
+        return AgentRequest(
+            messages=[],
+            tools=[],
+            stream=True,
+            raw_request=None,
+            protocol="unknown",
+        )
+
+    @pytest.mark.asyncio
+    async def test_buffered_stream_keeps_order_and_error(self, req):
+        """测试缓冲后元素顺序不变，上游异常在已有元素之后输出"""
+
+        async def invoke_agent(req: AgentRequest):
+            for i in range(10):
+                yield str(i)
+            raise RuntimeError("boom")
+
+        invoker = AgentInvoker(invoke_agent, stream_buffer_size=3)
+
+        items: List[AgentEvent] = []
+        async for item in invoker.invoke_stream(req):
+            items.append(item)
+
+        assert [item.data["delta"] for item in items[:-1]] == [
+            str(i) for i in range(10)
+        ]
+        assert items[-1].event == EventType.ERROR
+        assert items[-1].data["message"] == "boom"
+
+    @pytest.mark.asyncio
+    async def test_buffered_stream_cancels_producer_on_close(self, req):
+        """测试消费方提前结束时停止读取上游"""
+        import asyncio
+
+        produced: List[int] = []
+
+        async def invoke_agent(req: AgentRequest):
+            for i in range(100):
+                produced.append(i)
+                yield str(i)
+
+        invoker = AgentInvoker(invoke_agent, stream_buffer_size=2)
+
+        stream = invoker.invoke_stream(req)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+
+        assert first.data["delta"] == "0"
+        # 上游最多比消费方多读取缓冲大小加上正在等待放入的元素
+        assert len(produced) < 100
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stream_buffer_size", [0, 2])
+    async def test_closes_agent_generator_on_early_exit(
+        self, req, stream_buffer_size
+    ):
+        """测试消费方提前结束时 Agent 生成器的 finally 被执行"""
+        closed: List[bool] = []
+
+        async def invoke_agent(req: AgentRequest):
+            try:
+                for i in range(100):
+                    yield str(i)
+            finally:
+                closed.append(True)
+
+        invoker = AgentInvoker(
+            invoke_agent, stream_buffer_size=stream_buffer_size
+        )
+
+        stream = invoker.invoke_stream(req)
+        first = await stream.__anext__()
+        await stream.aclose()
+
+        assert first.data["delta"] == "0"
+        assert closed == [True]
+
+    @pytest.mark.asyncio
+    async def test_buffered_stream_propagates_base_exception(self, req):
+        """测试上游以 BaseException 结束时消费方不会一直等待"""
+        import asyncio
+
+        class Stop(BaseException):
+            pass
+
+        async def invoke_agent(req: AgentRequest):
+            yield "0"
+            raise Stop()
+
+        invoker = AgentInvoker(invoke_agent, stream_buffer_size=2)
+
+        async def consume() -> List[AgentEvent]:
+            return [item async for item in invoker.invoke_stream(req)]
+
+        with pytest.raises(Stop):
+            await asyncio.wait_for(consume(), timeout=1)
@@ -50,6 +50,15 @@ class TestOpenAIProtocolHandler:
         handler = OpenAIProtocolHandler(config)
         assert handler.get_model_name() == "custom-model"
 
+    def test_get_model_name_unset_in_config(self):
+        """测试配置中未设置模型名称时使用默认值"""
+        from agentrun.server.model import OpenAIProtocolConfig
+
+        config = ServerConfig(openai=OpenAIProtocolConfig())
+        handler = OpenAIProtocolHandler(config)
+        assert handler.get_model_name() == "agentrun"
+        assert handler.get_prefix() == "/openai/v1"
+
 
 class TestOpenAIProtocolEndpoints:
     """测试 OpenAI 协议端点"""
@@ -75,6 +84,9 @@ class TestOpenAIProtocolEndpoints:
         assert data["data"][0]["id"] == "agentrun"
         assert data["data"][0]["object"] == "model"
         assert data["data"][0]["owned_by"] == "agentrun"
+        assert isinstance(data["data"][0]["created"], int)
+        # 响应体在创建路由时生成，多次请求结果一致
+        assert client.get("/openai/v1/models").content == response.content
 
     @pytest.mark.asyncio
     async def test_missing_messages_error(self):
@@ -149,6 +161,39 @@ class TestOpenAIProtocolEndpoints:
         assert "error" in data
         assert "Invalid message role" in data["error"]["message"]
 
+    @pytest.mark.asyncio
+    async def test_non_string_role(self):
+        """测试非字符串角色返回 400"""
+
+        def invoke_agent(request: AgentRequest):
+            return "Hello"
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={"messages": [{"role": ["user"], "content": "Hello"}]},
+        )
+
+        assert response.status_code == 400
+        assert "Invalid message role" in response.json()["error"]["message"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_body(self):
+        """测试请求体不是合法 JSON 时返回 400"""
+
+        def invoke_agent(request: AgentRequest):
+            return "Hello"
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/openai/v1/chat/completions",
+            content="invalid json",
+            headers={"Content-Type": "application/json"},
+        )
+
+        assert response.status_code == 400
+        assert response.json()["error"]["type"] == "invalid_request_error"
+
     @pytest.mark.asyncio
     async def test_internal_error(self):
         """测试内部错误处理"""
@@ -196,6 +241,30 @@ class TestOpenAIProtocolEndpoints:
         assert "tool_calls" in data["choices"][0]["message"]
         assert data["choices"][0]["message"]["tool_calls"][0]["id"] == "tc-1"
 
+    @pytest.mark.asyncio
+    async def test_non_stream_sync_handler_returning_async_generator(self):
+        """测试同步 handler 返回异步生成器时非流式响应包含完整内容"""
+
+        async def generate():
+            yield "hello"
+            yield " world"
+
+        def invoke_agent(request: AgentRequest):
+            return generate()
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": False,
+            },
+        )
+
+        assert response.status_code == 200
+        message = response.json()["choices"][0]["message"]
+        assert message["content"] == "hello world"
+
     @pytest.mark.asyncio
     async def test_non_stream_response_collection(self):
         """测试非流式响应收集流式结果"""
@@ -434,6 +503,42 @@ class TestOpenAIProtocolEndpoints:
         delta = data["choices"][0]["delta"]
         assert "custom_tool_field" in delta
 
+    @pytest.mark.asyncio
+    async def test_addition_with_non_str_keys(self):
+        """测试 addition 中的非 str 键与 json.dumps 一样转为字符串"""
+
+        async def invoke_agent(request: AgentRequest):
+            yield AgentEvent(
+                event=EventType.TEXT,
+                data={"delta": "Hello"},
+                addition={"meta": {1: "x"}},
+            )
+            yield AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "name": "test", "args_delta": "{}"},
+                addition={"meta": {2: "y"}},
+            )
+
+        client = self.get_client(invoke_agent)
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": True,
+            },
+        )
+
+        assert response.status_code == 200
+        lines = [line async for line in response.aiter_lines() if line]
+
+        text_delta = json.loads(lines[0][6:])["choices"][0]["delta"]
+        assert text_delta["meta"] == {"1": "x"}
+        args_delta = json.loads(lines[2][6:])["choices"][0]["delta"]
+        assert args_delta["meta"] == {"2": "y"}
+        finish = json.loads(lines[-2][6:])["choices"][0]
+        assert finish["finish_reason"] == "tool_calls"
+        assert lines[-1] == "data: [DONE]"
+
     @pytest.mark.asyncio
     async def test_non_stream_multiple_tool_call_chunks(self):
         """测试非流式响应中多个工具调用 chunk 的合并"""
@@ -503,6 +608,91 @@ class TestOpenAIProtocolStreamBranches:
                     assert data["choices"][0]["finish_reason"] == "tool_calls"
                     break
 
+    @pytest.mark.asyncio
+    async def test_stream_with_batching(self):
+        """测试开启帧合并后流式输出完整且有序"""
+        from agentrun.server.model import OpenAIProtocolConfig
+
+        async def invoke_agent(request: AgentRequest):
+            yield "Hello"
+            yield " World"
+
+        config = ServerConfig(openai=OpenAIProtocolConfig(batch_bytes=4096))
+        server = AgentRunServer(invoke_agent=invoke_agent, config=config)
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": True,
+            },
+        )
+
+        assert response.status_code == 200
+        lines = [line for line in response.text.splitlines() if line]
+        assert lines[-1] == "data: [DONE]"
+        chunks = [json.loads(line[6:]) for line in lines[:-1]]
+        assert [c["choices"][0]["delta"].get("content") for c in chunks] == [
+            "Hello",
+            " World",
+            None,
+        ]
+        assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+    @pytest.mark.asyncio
+    async def test_stream_with_batching_agent_error(self):
+        """测试开启帧合并后 Agent 中途出错，已输出的内容和结束标记不丢失"""
+        from agentrun.server.model import OpenAIProtocolConfig
+
+        async def invoke_agent(request: AgentRequest):
+            yield "Hello"
+            raise RuntimeError("boom")
+
+        config = ServerConfig(openai=OpenAIProtocolConfig(batch_bytes=4096))
+        server = AgentRunServer(invoke_agent=invoke_agent, config=config)
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": True,
+            },
+        )
+
+        assert response.status_code == 200
+        lines = [line for line in response.text.splitlines() if line]
+        assert lines[-1] == "data: [DONE]"
+        chunks = [json.loads(line[6:]) for line in lines[:-1]]
+        assert chunks[0]["choices"][0]["delta"]["content"] == "Hello"
+        assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+
+    @pytest.mark.asyncio
+    async def test_batched_stream_flushes_before_format_error(self):
+        """测试格式化过程中抛出异常时，合并缓冲中的块先写出"""
+        from agentrun.server.protocol import batch_frames
+
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "test-model",
+            "created": 1,
+        }
+
+        async def event_stream():
+            yield AgentEvent(event=EventType.TEXT, data={"delta": "Hello"})
+            raise RuntimeError("boom")
+
+        chunks = []
+        with pytest.raises(RuntimeError, match="boom"):
+            async for chunk in batch_frames(
+                handler._format_stream(event_stream(), context), 4096, 10.0
+            ):
+                chunks.append(chunk)
+
+        assert len(chunks) == 1
+        data = json.loads(chunks[0][6:])
+        assert data["choices"][0]["delta"]["content"] == "Hello"
+
     @pytest.mark.asyncio
     async def test_stream_with_empty_content(self):
         """测试空内容不会发送"""
@@ -785,6 +975,42 @@ class TestOpenAIProtocolNonStreamBranches:
         assert data["choices"][0]["message"]["content"] == "Hello World"
         assert data["choices"][0]["finish_reason"] == "stop"
 
+    @pytest.mark.asyncio
+    async def test_format_non_stream_async_matches_list(self):
+        """测试边迭代边累积的结果与基于列表的结果一致"""
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "test-model",
+            "created": 1,
+        }
+        events = [
+            AgentEvent(event=EventType.TEXT, data={"delta": "Hello"}),
+            AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "name": "tool", "args_delta": '{"a":'},
+            ),
+            AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "args_delta": "1}"},
+            ),
+        ]
+
+        async def event_stream():
+            for event in events:
+                yield event
+
+        result = await handler._format_non_stream_async(event_stream(), context)
+
+        assert result == handler._format_non_stream(events, context)
+        choice = result["choices"][0]
+        assert choice["finish_reason"] == "tool_calls"
+        assert choice["message"]["content"] == "Hello"
+        assert choice["message"]["tool_calls"][0]["function"] == {
+            "name": "tool",
+            "arguments": '{"a":1}',
+        }
+
 
 class TestOpenAIProtocolApplyAddition:
     """测试 _apply_addition 方法"""
@@ -840,6 +1066,19 @@ class TestOpenAIProtocolApplyAddition:
         # role 保持不变
         assert result["role"] == "assistant"
 
+    def test_apply_addition_disjoint_keys_shallow_merge(self):
+        """测试字段不重复时浅合并，结果与深度合并一致"""
+        handler = OpenAIProtocolHandler()
+
+        delta = {"content": "Hello"}
+        addition = {"meta": {"source": "test"}}
+
+        result = handler._apply_addition(delta, addition)
+
+        assert result == {"content": "Hello", "meta": {"source": "test"}}
+        # 原始 delta 不被修改
+        assert delta == {"content": "Hello"}
+
 
 class TestOpenAIProtocolRawEvent:
     """测试 RAW 事件处理"""
@@ -1006,3 +1245,118 @@ class TestOpenAIProtocolRawEvent:
         tool_calls = data["choices"][0]["message"]["tool_calls"]
         assert len(tool_calls) == 1
         assert tool_calls[0]["function"]["arguments"] == ""
+
+
+class TestOpenAIProtocolBuildChunk:
+    """测试 _build_chunk 方法"""
+
+    def test_build_chunk_returns_utf8_bytes(self):
+        """测试返回 UTF-8 字节且非 ASCII 字符不转义"""
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "test-model",
+            "created": 1,
+        }
+
+        chunk = handler._build_chunk(context, {"content": "你好"})
+
+        assert isinstance(chunk, bytes)
+        assert chunk.startswith(b"data: ")
+        assert chunk.endswith(b"\n\n")
+        assert "你好".encode("utf-8") in chunk
+        data = json.loads(chunk[6:])
+        assert data["id"] == "chatcmpl-test"
+        assert data["choices"][0]["delta"] == {"content": "你好"}
+        assert data["choices"][0]["finish_reason"] is None
+
+    @pytest.mark.parametrize("finish_reason", [None, "stop"])
+    def test_build_chunk_matches_full_serialization(self, finish_reason):
+        """测试基于预序列化前缀拼接的结果与完整序列化一致"""
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "模型",
+            "created": 123,
+        }
+        delta = {"tool_calls": [{"index": 0, "function": {"arguments": "{}"}}]}
+
+        chunk = handler._build_chunk(context, delta, finish_reason)
+
+        expected = {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 123,
+            "model": "模型",
+            "choices": [{
+                "index": 0,
+                "delta": delta,
+                "finish_reason": finish_reason,
+            }],
+        }
+        assert json.loads(chunk[6:]) == expected
+        assert chunk.startswith(handler._build_chunk_prefix(context))
+
+    @pytest.mark.parametrize(
+        "finish_reason,suffix_name",
+        [
+            ("stop", "_FINISH_STOP_SUFFIX"),
+            ("tool_calls", "_FINISH_TOOL_CALLS_SUFFIX"),
+        ],
+    )
+    def test_finish_chunk_constants_match_build_chunk(
+        self, finish_reason, suffix_name
+    ):
+        """测试预序列化的 finish_reason 块与 _build_chunk 结果一致"""
+        from agentrun.server import openai_protocol
+
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "test-model",
+            "created": 1,
+        }
+
+        prefix = handler._build_chunk_prefix(context)
+        suffix = getattr(openai_protocol, suffix_name)
+        assert prefix + suffix == handler._build_chunk(
+            context, {}, finish_reason
+        )
+
+    @pytest.mark.asyncio
+    async def test_tool_call_args_chunk_matches_build_chunk(self):
+        """测试模板拼接的工具调用参数块与 _build_chunk 结果一致"""
+        handler = OpenAIProtocolHandler()
+        context = {
+            "response_id": "chatcmpl-test",
+            "model": "test-model",
+            "created": 1,
+        }
+
+        async def event_stream():
+            yield AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "name": "tool", "args_delta": '{"q":"你'},
+            )
+            yield AgentEvent(
+                event=EventType.TOOL_CALL_CHUNK,
+                data={"id": "tc-1", "args_delta": '好"}'},
+            )
+
+        chunks = [
+            chunk
+            async for chunk in handler._format_stream(event_stream(), context)
+        ]
+
+        assert chunks[1] == handler._build_chunk(
+            context,
+            {
+                "tool_calls": [
+                    {"index": 0, "function": {"arguments": '{"q":"你'}}
+                ]
+            },
+        )
+        assert chunks[2] == handler._build_chunk(
+            context,
+            {"tool_calls": [{"index": 0, "function": {"arguments": '好"}'}}]},
+        )
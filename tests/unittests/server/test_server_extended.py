@@ -3,6 +3,8 @@
 测试 AgentRunServer 的 CORS 配置和其他功能。
 """
 
+import asyncio
+import threading
 from unittest.mock import MagicMock, patch
 
 from fastapi.testclient import TestClient
@@ -162,6 +164,153 @@ class TestServerFastAPIApp:
         assert response.status_code == 200
 
 
+class TestServerStreamBuffer:
+    """测试流式缓冲配置"""
+
+    def test_stream_buffer_size_passed_to_invoker(self):
+        """测试 stream_buffer_size 传递给 AgentInvoker 且流式输出完整"""
+
+        async def invoke_agent(request: AgentRequest):
+            for word in ["Hello", " ", "World"]:
+                yield word
+
+        server = AgentRunServer(
+            invoke_agent=invoke_agent,
+            config=ServerConfig(stream_buffer_size=2),
+        )
+        assert server.agent_invoker.stream_buffer_size == 2
+
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": True,
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.text.count('"content"') == 3
+        assert response.text.endswith("data: [DONE]\n\n")
+
+
+class TestServerInvokerConfig:
+    """测试 ServerConfig 中的调用器配置"""
+
+    def test_inline_sync_passed_to_invoker(self):
+        """测试 inline_sync 传递给 AgentInvoker 且同步 Agent 在事件循环线程执行"""
+        in_loop = []
+
+        def invoke_agent(request: AgentRequest):
+            try:
+                asyncio.get_running_loop()
+                in_loop.append(True)
+            except RuntimeError:
+                in_loop.append(False)
+            return "Hello"
+
+        server = AgentRunServer(
+            invoke_agent=invoke_agent,
+            config=ServerConfig(inline_sync=True),
+        )
+        assert server.agent_invoker.inline_sync is True
+
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+        )
+
+        assert response.status_code == 200
+        assert response.json()["choices"][0]["message"]["content"] == "Hello"
+        assert in_loop == [True]
+
+    def test_sync_batch_size_passed_to_invoker(self):
+        """测试 sync_batch_size 传递给 AgentInvoker 且流式输出完整"""
+
+        def invoke_agent(request: AgentRequest):
+            for word in ["Hello", " ", "World"]:
+                yield word
+
+        server = AgentRunServer(
+            invoke_agent=invoke_agent,
+            config=ServerConfig(sync_batch_size=2),
+        )
+        assert server.agent_invoker.sync_batch_size == 2
+
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={
+                "messages": [{"role": "user", "content": "Hi"}],
+                "stream": True,
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.text.count('"content"') == 3
+        assert response.text.endswith("data: [DONE]\n\n")
+
+    def test_thread_pool_size_passed_to_invoker(self):
+        """测试 thread_pool_size 为同步 Agent 创建独立线程池"""
+        thread_names = []
+
+        def invoke_agent(request: AgentRequest):
+            thread_names.append(threading.current_thread().name)
+            return "Hello"
+
+        server = AgentRunServer(
+            invoke_agent=invoke_agent,
+            config=ServerConfig(thread_pool_size=2),
+        )
+        assert server.agent_invoker._executor._max_workers == 2
+
+        client = TestClient(server.as_fastapi_app())
+        response = client.post(
+            "/openai/v1/chat/completions",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+        )
+
+        assert response.status_code == 200
+        assert thread_names[0].startswith("agent-invoke")
+
+    def test_thread_pool_shut_down_with_app(self):
+        """测试应用停止时关闭 thread_pool_size 创建的线程池"""
+
+        def invoke_agent(request: AgentRequest):
+            return "Hello"
+
+        server = AgentRunServer(
+            invoke_agent=invoke_agent,
+            config=ServerConfig(thread_pool_size=2),
+        )
+        executor = server.agent_invoker._executor
+
+        with TestClient(server.as_fastapi_app()) as client:
+            response = client.post(
+                "/openai/v1/chat/completions",
+                json={"messages": [{"role": "user", "content": "Hi"}]},
+            )
+            assert response.status_code == 200
+            assert not executor._shutdown
+
+        assert executor._shutdown
+        # 重复调用不会出错
+        server.shutdown()
+
+    def test_invoker_defaults_without_config(self):
+        """测试未提供配置时调用器使用默认值"""
+
+        def invoke_agent(request: AgentRequest):
+            return "Hello"
+
+        server = AgentRunServer(invoke_agent=invoke_agent)
+
+        assert server.agent_invoker.inline_sync is False
+        assert server.agent_invoker.sync_batch_size == 1
+        assert server.agent_invoker.stream_buffer_size == 0
+
+
 class TestServerStartMethod:
     """测试 start 方法"""
 